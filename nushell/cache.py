@@ -0,0 +1,156 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import collections
+import json
+import time
+
+# Default number of results to keep in memory
+CACHE_SIZE = 1024
+
+# Remove old entries from a DiskCache after this many are added
+EVICT_EVERY = 256
+
+# Returned by get when a key isn't in the cache (None can be a result)
+MISSING = object()
+
+
+class MemoryCache:
+
+    def __init__(self, size=CACHE_SIZE):
+        '''a MemoryCache keeps up to size results in memory, and when full
+           removes the least recently used. We count hits and misses so
+           the plugin can log them.
+
+           Parameters
+           ==========
+           size: the maximum number of results to keep
+        '''
+        self.size = size
+        self.results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        '''return the result for a key, or MISSING if we don't have it
+        '''
+        try:
+            result = self.results[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+        self.results.move_to_end(key)
+        self.hits += 1
+        return result
+
+
+    def set(self, key, result):
+        '''save the result for a key, removing the oldest if we are full
+        '''
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+
+    def close(self):
+        '''a MemoryCache doesn't need to be closed, but a DiskCache does
+        '''
+
+
+    def __len__(self):
+        return len(self.results)
+
+
+class DiskCache:
+
+    def __init__(self, path, version="", ttl=None, size=None):
+        '''a DiskCache keeps results in an sqlite database, so they are
+           shared between plugin processes (nushell starts a new one for
+           every pipeline). Keys and results must be json serializable.
+           Several processes can use the same database at once.
+
+           Parameters
+           ==========
+           path: the path to the sqlite database
+           version: results saved with a different version are ignored
+           ttl: if defined, ignore (and remove) results older than ttl seconds
+           size: if defined, keep at most this many (the newest) results
+        '''
+        self.path = path
+        self.version = version
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        import sqlite3
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+                        "version TEXT, created REAL, result TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+
+
+    def _key(self, key):
+        return json.dumps(key, sort_keys=True)
+
+
+    def get(self, key):
+        '''return the result for a key, or MISSING if we don't have it (or
+           it's expired, or from a different version)
+        '''
+        row = self.db.execute("SELECT version, created, result FROM results "
+                              "WHERE key = ?", (self._key(key),)).fetchone()
+        if row is None or row[0] != self.version or \
+           (self.ttl is not None and row[1] < time.time() - self.ttl):
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return json.loads(row[2])
+
+
+    def set(self, key, result):
+        '''save the result for a key, occasionally removing old results
+        '''
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                        (self._key(key), self.version, time.time(),
+                         json.dumps(result)))
+        self.added += 1
+        if self.added % EVICT_EVERY == 0:
+            self.evict()
+
+
+    def evict(self):
+        '''remove results from other versions, expired results, and the
+           oldest results if there are more than size.
+        '''
+        self.db.execute("DELETE FROM results WHERE version != ?", (self.version,))
+        if self.ttl is not None:
+            self.db.execute("DELETE FROM results WHERE created < ?",
+                            (time.time() - self.ttl,))
+        if self.size is not None:
+            self.db.execute("DELETE FROM results WHERE key NOT IN (SELECT key "
+                            "FROM results ORDER BY created DESC LIMIT ?)",
+                            (self.size,))
+
+
+    def close(self):
+        '''remove old results and close the database
+        '''
+        if self.db is None:
+            return
+        self.evict()
+        self.db.close()
+        self.db = None
+
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM results WHERE version = ?",
+                               (self.version,)).fetchone()[0]
@@ -0,0 +1,249 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import re
+
+# Order to try codecs when the user doesn't choose one
+CODECS = ["orjson", "ujson", "simdjson", "json"]
+
+# Wire encodings for the persistent protocol
+ENCODINGS = ["json", "msgpack"]
+
+# An integer of 2**64 or more has at least 20 digits
+LONG_NUMBER = re.compile(r"[0-9]{20}")
+LONG_NUMBER_BYTES = re.compile(rb"[0-9]{20}")
+
+
+class JsonCodec:
+    '''a JsonCodec decodes requests from nushell, and encodes responses.
+       This base codec uses the standard library json module, and others
+       subclass it to use faster libraries if they are installed.
+    '''
+    name = "json"
+    encoding = "json"
+    binary = False
+    decoder = json.JSONDecoder()
+
+    def loads(self, line):
+        '''decode a line (str or utf-8 bytes) into a Python object
+        '''
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        return self.decoder.decode(line)
+
+    def dumps(self, obj):
+        '''encode a Python object into a json string
+        '''
+        return json.dumps(obj)
+
+    def encode(self, obj):
+        '''encode a Python object into utf-8 json bytes
+        '''
+        return self.dumps(obj).encode('utf-8')
+
+    def frame(self, obj):
+        '''encode a Python object as one message on the wire (a line)
+        '''
+        return self.encode(obj) + b"\n"
+
+
+class OrjsonCodec(JsonCodec):
+    '''use orjson, falling back to json for integers larger than 64 bits.
+       orjson can't encode them, and decodes them as floats.
+    '''
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+        self.option = orjson.OPT_NON_STR_KEYS
+
+    def loads(self, line):
+        pattern = LONG_NUMBER_BYTES if isinstance(line, bytes) else LONG_NUMBER
+        if pattern.search(line):
+            return JsonCodec.loads(self, line)
+        return self.orjson.loads(line)
+
+    def dumps(self, obj):
+        return self.encode(obj).decode('utf-8')
+
+    def encode(self, obj):
+        try:
+            return self.orjson.dumps(obj, option=self.option)
+        except TypeError:
+            return json.dumps(obj).encode('utf-8')
+
+
+class UjsonCodec(JsonCodec):
+    '''use ujson to encode and decode, falling back to json for integers
+       larger than 64 bits (which ujson refuses)
+    '''
+    name = "ujson"
+
+    def __init__(self):
+        import ujson # pylint: disable=import-error
+        self.ujson = ujson
+
+    def loads(self, line):
+        try:
+            return self.ujson.loads(line)
+        except ValueError:
+            return JsonCodec.loads(self, line)
+
+    def dumps(self, obj):
+        try:
+            return self.ujson.dumps(obj, ensure_ascii=False)
+        except OverflowError:
+            return json.dumps(obj)
+
+
+class SimdjsonCodec(JsonCodec):
+    '''use pysimdjson to decode, falling back to json for what it refuses
+       (e.g., integers larger than 64 bits). It doesn't encode, so we use
+       json for that.
+    '''
+    name = "simdjson"
+
+    def __init__(self):
+        import simdjson # pylint: disable=import-error
+        self.simdjson = simdjson
+
+    def loads(self, line):
+        try:
+            return self.simdjson.loads(line)
+        except ValueError:
+            return JsonCodec.loads(self, line)
+
+
+class MsgpackCodec(JsonCodec):
+    '''use msgpack to encode and decode binary messages for the persistent
+       protocol. Messages are self delimiting, so they are written one after
+       the other (without a newline) and read with an unpacker.
+    '''
+    name = "msgpack"
+    encoding = "msgpack"
+    binary = True
+
+    def __init__(self):
+        import msgpack # pylint: disable=import-error
+        self.msgpack = msgpack
+
+    def loads(self, data): # pylint: disable=arguments-renamed
+        return self.msgpack.unpackb(data, raw=False)
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=repr)
+
+    def encode(self, obj):
+        return self.msgpack.packb(obj, use_bin_type=True)
+
+    def frame(self, obj):
+        return self.encode(obj)
+
+    def unpacker(self):
+        '''return an Unpacker to feed bytes, and iterate over messages
+        '''
+        return self.msgpack.Unpacker(raw=False)
+
+
+class ResponseTemplate:
+
+    def __init__(self, codec, obj, placeholders):
+        '''a ResponseTemplate is a message encoded once with placeholders,
+           split into the bytes between them. To encode the message with
+           values, we encode just the values and join them with the pieces,
+           which gives the same bytes as encoding the message again.
+
+           Parameters
+           ==========
+           codec: the (json) codec to encode with
+           obj: the message, with a placeholder (a str) for each value
+           placeholders: a dictionary with a name and placeholder for each
+                         value, in the order they are encoded
+        '''
+        data = codec.frame(obj)
+        self.names = list(placeholders)
+        self.pieces = []
+        for placeholder in placeholders.values():
+            piece, found, data = data.partition(codec.encode(placeholder))
+            if not found:
+                raise ValueError("%s is not in the template" % placeholder)
+            self.pieces.append(piece)
+        self.tail = data
+
+
+    def render(self, values):
+        '''return the message with a list of encoded values (bytes), in the
+           order of the names
+        '''
+        data = [piece + value for piece, value in zip(self.pieces, values)]
+        data.append(self.tail)
+        return b"".join(data)
+
+
+lookup = {"json": JsonCodec,
+          "orjson": OrjsonCodec,
+          "ujson": UjsonCodec,
+          "simdjson": SimdjsonCodec}
+
+
+def get_codec(name=None, logger=None):
+    '''get a codec by name, or from the environment variable NU_PLUGIN_CODEC.
+       If not set (or "auto") we use the first codec in CODECS that can be
+       imported. If a requested codec is not installed, we fall back to json.
+
+       Parameters
+       ==========
+       name: the name of the codec, one of auto, json, orjson, ujson, simdjson
+       logger: if provided, warn when a requested codec isn't installed
+    '''
+    name = name or os.environ.get("NU_PLUGIN_CODEC") or "auto"
+    name = name.lower()
+
+    if name == "auto":
+        for contender in CODECS:
+            try:
+                return lookup[contender]()
+            except ImportError:
+                pass
+
+    if name not in lookup:
+        raise ValueError("%s is not a valid codec, choices are %s"
+                         % (name, ", ".join(["auto"] + CODECS)))
+    try:
+        return lookup[name]()
+    except ImportError:
+        if logger is not None:
+            logger.warning("%s is not installed, using json", name)
+    return JsonCodec()
+
+
+def get_encoding(name=None, codec=None, logger=None):
+    '''get the codec for a wire encoding of the persistent protocol, by
+       name or from the environment variable NU_PLUGIN_ENCODING (default
+       json). If msgpack is not installed, we fall back to json.
+
+       Parameters
+       ==========
+       name: the name of the encoding, one of json or msgpack
+       codec: the json codec to use for the json encoding
+       logger: if provided, warn when msgpack isn't installed
+    '''
+    name = (name or os.environ.get("NU_PLUGIN_ENCODING") or "json").lower()
+    if name not in ENCODINGS:
+        raise ValueError("%s is not a valid encoding, choices are %s"
+                         % (name, ", ".join(ENCODINGS)))
+
+    if name == "msgpack":
+        try:
+            return MsgpackCodec()
+        except ImportError:
+            if logger is not None:
+                logger.warning("msgpack is not installed, using json")
+    return codec or get_codec(logger=logger)
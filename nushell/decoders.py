@@ -0,0 +1,125 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A decoder takes the Primitive of an argument, e.g., {"Int": "5"}, and
+# returns a Python value for the SyntaxShape the argument was declared
+# with. The plugin compiles a decoder for each argument (see
+# PluginBase.get_decoders) so parsing params is a lookup per argument.
+
+import decimal
+import fnmatch
+import pathlib
+import re
+
+
+class ColumnPath:
+
+    def __init__(self, members):
+        '''a ColumnPath is a list of members (names or indices) to get a
+           value from a row, e.g., path(row) for the path "meta.tags.0"
+           is row["meta"]["tags"][0].
+
+           Parameters
+           ==========
+           members: the members from nushell, a list with a primitive for
+                    each, or a dictionary with the list under "members"
+        '''
+        if isinstance(members, dict):
+            members = members.get("members", [])
+        self.members = [get_member(member) for member in members]
+
+
+    def __call__(self, row):
+        for member in self.members:
+            row = row[member]
+        return row
+
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnPath) and self.members == other.members
+
+
+    def __repr__(self):
+        return "ColumnPath(%s)" % ".".join(str(member) for member in self.members)
+
+
+def get_member(member):
+    '''return the name (str) or index (int) of a column path member, which
+       can be tagged ({"item": ...}), unspanned ({"unspanned": ...}), or
+       have a value and span ({"String": {"val": "a", "span": ...}})
+    '''
+    while isinstance(member, dict):
+        if "item" in member:
+            member = member["item"]
+        elif "unspanned" in member:
+            member = member["unspanned"]
+        elif "val" in member:
+            member = member["val"]
+        else:
+            member_type, member = next(iter(member.items()))
+            if member_type == "Int" and not isinstance(member, dict):
+                return int(member)
+    return member
+
+
+def get_value(primitive):
+    '''return the value of a primitive as it is (for Any, Switch, Block...)
+    '''
+    return next(iter(primitive.values()))
+
+
+def decode_string(primitive):
+    value = next(iter(primitive.values()))
+    return value if isinstance(value, str) else str(value)
+
+
+def decode_int(primitive):
+    return int(next(iter(primitive.values())))
+
+
+def decode_number(primitive):
+    '''an Int is an int, and anything else (a Decimal) a decimal.Decimal
+    '''
+    primitive_type, value = next(iter(primitive.items()))
+    if primitive_type == "Int":
+        return int(value)
+    return decimal.Decimal(str(value))
+
+
+def decode_path(primitive):
+    return pathlib.Path(next(iter(primitive.values())))
+
+
+def decode_pattern(primitive):
+    '''a Pattern is a glob, we return a compiled regular expression to match
+    '''
+    return re.compile(fnmatch.translate(next(iter(primitive.values()))))
+
+
+def decode_column_path(primitive):
+    return ColumnPath(next(iter(primitive.values())))
+
+
+# A decoder for each SyntaxShape, and for a Switch
+DECODERS = {"Any": get_value,
+            "Block": get_value,
+            "List": get_value,
+            "Switch": get_value,
+            "String": decode_string,
+            "Member": decode_string,
+            "Int": decode_int,
+            "Number": decode_number,
+            "Path": decode_path,
+            "Pattern": decode_pattern,
+            "ColumnPath": decode_column_path}
+
+
+def get_decoder(shape):
+    '''return the decoder for a SyntaxShape (or Switch), get_value if we
+       don't know it
+    '''
+    return DECODERS.get(shape, get_value)
@@ -0,0 +1,264 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A stand-in for nushell, to measure plugins without it. The driver sends
+# the same json-rpc requests that nushell does, and times the responses:
+#
+#   python -m nushell.driver examples/len/nu_plugin_len --items 10000
+#   python -m nushell.driver examples/hello/nu_plugin_hello --sink --items 100000
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Send requests one at a time (like nushell), or without waiting
+MODES = ["lockstep", "pipelined"]
+
+# Latency percentiles to report
+PERCENTILES = [50, 99, 99.9]
+
+
+def get_entry(value, start=0):
+    '''return the tag and item (Primitive) for a Python value
+    '''
+    if isinstance(value, bool):
+        primitive_type = "Boolean"
+    elif isinstance(value, int):
+        primitive_type = "Int"
+    elif isinstance(value, float):
+        primitive_type = "Decimal"
+    else:
+        primitive_type = "String"
+    return {"tag": {"anchor": None, "span": {"start": start, "end": start + 1}},
+            "item": {"Primitive": {primitive_type: value}}}
+
+
+def get_args(positional=None, named=None):
+    '''return the args and name_tag of a begin_filter or sink request
+    '''
+    named = dict((name, get_entry(value)) for name, value in (named or {}).items())
+    positional = [get_entry(value) for value in positional or []] or None
+    return {"args": {"positional": positional, "named": named},
+            "name_tag": {"anchor": None, "span": {"start": 0, "end": 1}}}
+
+
+def get_request(method, params):
+    return {"jsonrpc": "2.0", "method": method, "params": params}
+
+
+def percentile(latencies, percent):
+    '''return the nearest-rank percentile of a sorted list
+    '''
+    if not latencies:
+        return None
+    index = max(0, int(round(percent / 100.0 * len(latencies))) - 1)
+    return latencies[min(index, len(latencies) - 1)]
+
+
+def get_report(seconds, latencies, items):
+    '''return items/sec and latency percentiles (in milliseconds)
+    '''
+    latencies = sorted(latency * 1000 for latency in latencies)
+    report = {"items": items,
+              "seconds": seconds,
+              "items_per_second": items / seconds if seconds else None}
+    for percent in PERCENTILES:
+        report["p%s" % percent] = percentile(latencies, percent)
+    return report
+
+
+class PluginDriver:
+
+    def __init__(self, command, env=None):
+        '''a PluginDriver runs a plugin (a command, e.g., the path to the
+           script) the way nushell does, with a new process for each of
+           config, a filter pipeline, or a sink.
+
+           Parameters
+           ==========
+           command: the plugin script, or a list with a command to run it
+           env: the environment for the plugin (defaults to ours)
+        '''
+        if isinstance(command, str):
+            command = [sys.executable, command]
+        self.command = command
+        self.env = env
+
+
+    def start(self):
+        return subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, env=self.env)
+
+
+    def send(self, process, request):
+        process.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+        process.stdin.flush()
+
+
+    def receive(self, process):
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("%s exited without a response" % " ".join(self.command))
+        return json.loads(line)
+
+
+    def stop(self, process):
+        process.stdin.close()
+        process.stdout.close()
+        return process.wait()
+
+
+    def config(self):
+        '''ask the plugin for its config, and return it
+        '''
+        process = self.start()
+        try:
+            self.send(process, get_request("config", []))
+            return self.receive(process)["params"]["Ok"]
+        finally:
+            self.stop(process)
+
+
+    def filter(self, values, mode="lockstep", window=None, positional=None,
+               named=None):
+        '''send begin_filter, a filter request for each value, and then
+           end_filter, and return a report with items/sec and per-item
+           latency. In lockstep mode (like nushell) we wait for each
+           response before sending the next request. In pipelined mode
+           requests are sent without waiting, with at most window
+           requests (all if not defined) waiting for a response.
+
+           Parameters
+           ==========
+           values: a list of values to filter (str, int, float or bool)
+           mode: lockstep or pipelined
+           window: the maximum number of requests in flight (pipelined)
+           positional: a list of positional arguments for begin_filter
+           named: a dictionary of named arguments for begin_filter
+        '''
+        if mode not in MODES:
+            raise ValueError("%s is not a valid mode, choices are %s"
+                             % (mode, ", ".join(MODES)))
+
+        requests = [get_request("filter", get_entry(value)) for value in values]
+        process = self.start()
+        try:
+            self.send(process, get_request("begin_filter", get_args(positional, named)))
+            self.receive(process)
+
+            start = time.perf_counter()
+            if mode == "lockstep":
+                latencies = self._lockstep(process, requests)
+            else:
+                latencies = self._pipelined(process, requests, window)
+            seconds = time.perf_counter() - start
+
+            self.send(process, get_request("end_filter", []))
+            self.receive(process)
+        finally:
+            self.stop(process)
+        return get_report(seconds, latencies, len(values))
+
+
+    def _lockstep(self, process, requests):
+        latencies = []
+        for request in requests:
+            sent = time.perf_counter()
+            self.send(process, request)
+            self.receive(process)
+            latencies.append(time.perf_counter() - sent)
+        return latencies
+
+
+    def _pipelined(self, process, requests, window=None):
+        '''send requests from a thread (so neither side blocks on a full
+           pipe) and read the responses here, in order
+        '''
+        sent = [None] * len(requests)
+        slots = threading.Semaphore(window) if window else None
+
+        def send():
+            for index, request in enumerate(requests):
+
+                # Before we wait for a slot, the plugin must see what we sent
+                if slots is not None and not slots.acquire(blocking=False):
+                    process.stdin.flush()
+                    slots.acquire()
+                sent[index] = time.perf_counter()
+                process.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+            process.stdin.flush()
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+
+        latencies = []
+        for index in range(len(requests)):
+            self.receive(process)
+            latencies.append(time.perf_counter() - sent[index])
+            if slots is not None:
+                slots.release()
+        sender.join()
+        return latencies
+
+
+    def sink(self, values, positional=None, named=None):
+        '''send one sink request with values as the pipe, and return a
+           report with items/sec (the latency is for the whole request)
+           and the output of the sink.
+        '''
+        params = [get_args(positional, named),
+                  [get_entry(value) for value in values]]
+        process = self.start()
+        start = time.perf_counter()
+        self.send(process, get_request("sink", params))
+        process.stdin.close()
+        output = process.stdout.read()
+        seconds = time.perf_counter() - start
+        process.stdout.close()
+        process.wait()
+
+        report = get_report(seconds, [seconds], len(values))
+        report["output"] = output.decode('utf-8')
+        return report
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Run a nushell plugin without nushell")
+    parser.add_argument("plugin", help="the plugin script to run")
+    parser.add_argument("--items", type=int, default=10000,
+                        help="the number of values to send")
+    parser.add_argument("--value", default="pancakes",
+                        help="the value to send (an Int if it's a number)")
+    parser.add_argument("--mode", choices=MODES, default="lockstep",
+                        help="wait for each response (lockstep) or not (pipelined)")
+    parser.add_argument("--window", type=int, default=None,
+                        help="the maximum number of requests in flight (pipelined)")
+    parser.add_argument("--sink", action="store_true",
+                        help="send the values as the pipe of one sink request")
+    return parser
+
+
+def main(args=None):
+    args = get_parser().parse_args(args)
+    value = int(args.value) if args.value.lstrip("-").isdigit() else args.value
+    values = [value] * args.items
+    driver = PluginDriver(os.path.abspath(args.plugin))
+
+    if args.sink:
+        report = driver.sink(values)
+        report.pop("output")
+    else:
+        report = driver.filter(values, mode=args.mode, window=args.window)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,24 @@
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
-from nushell.plugin import PluginBase
-
-import copy
-import fileinput
+from nushell.cache import MemoryCache, CACHE_SIZE, MISSING
+from nushell.codec import ResponseTemplate
+from nushell.lazy import LazyFunction, get_function, is_coroutine_function
+from nushell.persistent import PersistentServer, is_persistent
+from nushell.plugin import PluginBase, CONCURRENCY
+from nushell.profiler import profiled
+from nushell.reader import RequestReader
+from nushell.signature import is_signature
+
+import collections
+import itertools
 import json
+import os
+import time
+import types
+
+# Default number of filter requests to pass to a run_batch function at once
+BATCH_SIZE = 256
 
 
 class FilterPlugin(PluginBase):
@@ -22,6 +35,11 @@ class FilterPlugin(PluginBase):
     args = {}
     params = {}
     is_filter = True
+    memo = None
+    _recording = None
+    _capture = False
+    _templates = None
+    _filtering = False
 
     # Filter functions work by way of getting primities from the input item
 
@@ -41,6 +59,25 @@ class FilterPlugin(PluginBase):
             return list(self.params["item"]["Primitive"].values())[0]
 
 
+    def get_primitive_response(self, value, primitive_type, params=None):
+        '''return a response with an updated value for a primitive type,
+           sharing the original (unchanged) tag from the params.
+
+           Parameters
+           ==========
+           value: The primitive value, expected to match the type
+           primitive_type: one of Int or String
+           params: the params of the filter request, defaults to self.params
+        '''
+        if params is None:
+            params = self.params
+
+        primitive_type = self._camel_case(primitive_type)
+        response = dict(params)
+        response["item"] = {"Primitive": {primitive_type: value}}
+        return [{"Ok": {"Value": response}}]
+
+
     def print_primitive_response(self, value, primitive_type, 
                                        return_response=False):
         '''a base function to print a good response with an updated
@@ -51,19 +88,10 @@ class FilterPlugin(PluginBase):
            primitive_type: one of Int or String
            return_response: if True, just return (don't print)
         '''
-        primitive_type = self._camel_case(primitive_type)
-        item = {"Primitive": {primitive_type: value}}
-
-        # Get the original complete passed parameters to update
-        response = copy.deepcopy(self.params)
-        response["item"] = item
-        response = [{"Ok": {"Value": response}}]
-
         # For testing, we might just want to return response
         if return_response:
-            return response
-
-        self.print_good_response(response)
+            return self.get_primitive_response(value, primitive_type)
+        self._print_primitive(value, primitive_type, self.params)
 
 
     def print_int_response(self, value):
@@ -72,6 +100,119 @@ class FilterPlugin(PluginBase):
     def print_string_response(self, value):
         return self.print_primitive_response(value, "String")
 
+
+    def _print_primitive(self, value, primitive_type, params):
+        '''print the response for a primitive. Unless we are recording it
+           (to memoize, or in persistent mode) we don't build the response,
+           but encode the tag and value into a template for the params.
+        '''
+        if self._recording is not None or self.codec.binary:
+            return self.print_good_response(
+                self.get_primitive_response(value, primitive_type, params))
+
+        start = time.perf_counter()
+        try:
+            template = self._templates[self.codec, primitive_type, tuple(params)]
+        except (KeyError, TypeError):
+            template = self.get_response_template(primitive_type, params)
+
+        # Only an exact int, a bool (or IntEnum) must be encoded by the codec
+        encode = self.codec.encode
+        if primitive_type == "Int" and type(value) is int: # pylint: disable=unidiomatic-typecheck
+            encoded = b"%d" % value
+        else:
+            encoded = encode(value)
+        data = template.render([encoded if name == "item" else encode(params[name])
+                                for name in template.names])
+        self.metrics.record("encode", time.perf_counter() - start)
+        self.logger.info("Printing %s response %s", primitive_type, value)
+        self.writer.write(data)
+
+
+    def get_response_template(self, primitive_type, params):
+        '''return the ResponseTemplate of a primitive response, for the keys
+           of the params (e.g., tag and item). Templates are made once for
+           each type and set of keys, and the tag and value are placeholders.
+        '''
+        if self._templates is None:
+            self._templates = {}
+
+        key = (self.codec, primitive_type, tuple(params))
+        template = self._templates.get(key)
+        if template is None:
+            template_params = dict((name, "\x00nu_plugin:%s\x00" % name)
+                                   for name in list(params) + ["item"])
+            response = self.get_good_response(self.get_primitive_response(
+                template_params["item"], primitive_type, template_params))
+            template = ResponseTemplate(self.codec, response, template_params)
+            self._templates[key] = template
+        return template
+
+
+    def get_value_item(self, value, params=None):
+        '''return the item for a Python value: a Row for a dict, a Table
+           for a list, a primitive for a (value, primitive_type) tuple, or
+           else a primitive with the type derived from the Python type.
+           Values in a Row or Table get the tag of the params.
+        '''
+        if params is None:
+            params = self.params
+
+        if isinstance(value, dict):
+            return {"Row": {"entries": dict((str(name), self.get_value_entry(entry, params))
+                                            for name, entry in value.items())}}
+        if isinstance(value, list):
+            return {"Table": [self.get_value_entry(entry, params) for entry in value]}
+
+        if isinstance(value, tuple):
+            value, primitive_type = value
+            primitive_type = self._camel_case(primitive_type)
+        else:
+            primitive_type = self.get_primitive_type(value)
+        return {"Primitive": {primitive_type: value}}
+
+
+    def get_value_entry(self, value, params=None):
+        '''return the tag (from the params) and item for a Python value
+        '''
+        if params is None:
+            params = self.params
+        entry = dict(params)
+        entry["item"] = self.get_value_item(value, params)
+        return entry
+
+
+    def get_values_response(self, values, params=None):
+        '''return a response with an entry for each of many values (a list
+           or generator), e.g., the words in a line. Each value can be a
+           primitive, a (value, primitive_type) tuple, a dict for a row,
+           or a list for a table. No values is an empty response.
+
+           Parameters
+           ==========
+           values: an iterable of values to return for one filter request
+           params: the params of the filter request, defaults to self.params
+        '''
+        return [{"Ok": {"Value": self.get_value_entry(value, params)}}
+                for value in values]
+
+
+    def print_values(self, values, params=None):
+        '''print one response with many values (see get_values_response)
+        '''
+        self.print_good_response(self.get_values_response(values, params))
+
+
+    def _run_filter(self, runFilter):
+        '''call runFilter for the current params. If it yields values (it's
+           a generator) we print them as one response. Anything it returns
+           is ignored, e.g., the response from print_primitive_response.
+        '''
+        result = runFilter(self, self.args)
+        if isinstance(result, types.GeneratorType):
+            self.print_values(result)
+
+
     def test(self, runFilter, line):
         '''given a line, test the response
         '''
@@ -95,6 +236,11 @@ class FilterPlugin(PluginBase):
         # End filter can end the filter, OR call a custom sink function
         elif method == "end_filter":
 
+            if self.memo is not None:
+                self.logger.info("MEMO hits %s misses %s size %s",
+                                 self.memo.hits, self.memo.misses, len(self.memo))
+            self.metrics.dump(self.logger)
+
             # If the user wants help, return the help and break
             if "help" in self.args:
 
@@ -106,58 +252,571 @@ class FilterPlugin(PluginBase):
 
         # Run the filter, passing the unparsed params
         elif method == "filter":
-            return runFilter(self, self.args)
+            result = runFilter(self, self.args)
+            if isinstance(result, types.GeneratorType):
+                return self.get_good_response(self.get_values_response(result))
+            return result
 
 
+    def get_primitive_type(self, value):
+        '''return the primitive type for a Python value returned by a batch
+           function: Boolean, Int, Decimal (a float), String or Nothing (for
+           None). Any other type is a TypeError, and should be returned as a
+           (value, primitive_type) tuple or converted to one of these.
+        '''
+        if isinstance(value, bool):
+            return "Boolean"
+        elif isinstance(value, int):
+            return "Int"
+        elif isinstance(value, float):
+            return "Decimal"
+        elif isinstance(value, str):
+            return "String"
+        elif value is None:
+            return "Nothing"
+        raise TypeError("%s has no primitive type, return a (value, primitive_type) tuple"
+                        % type(value).__name__)
+
+
+    def set_args(self, params):
+        '''parse and save the args for the filter requests that follow
+        '''
+        self.args = self.parse_params(params)
+        self._args_key = json.dumps(self.args, sort_keys=True, default=str)
+
+
+    def _flush(self):
+        '''write the responses, and then dump the metrics (once, if we
+           began a filter) so they include the writes, and the log
+        '''
+        self.writer.flush()
+        if self._filtering:
+            self._filtering = False
+            self.metrics.dump(self.logger)
+        self.logger.flush()
+
+
+    def _respond(self, method):
+        '''respond to any request that isn't a filter, and return True
+           if we should continue reading requests.
+        '''
+        # Case 1: Nu is asking for the config to discover the plugin
+        if method == "config":
+            plugin_config = self.get_config()
+            self.logger.info("plugin-config: %s", lambda: self.codec.dumps(plugin_config))
+            self.print_good_response(plugin_config)
+            return False
+
+        elif method == "begin_filter":
+
+            # Arguments only show up for begin_filter
+            self.set_args(self.params)
+            self.logger.info("Begin Filter Args: %s", self.args)
+            self.print_good_response([])
+            self._filtering = True
+            return True
+
+        # End filter can end the filter, OR call a custom sink function
+        elif method == "end_filter":
+
+            if self.memo is not None:
+                self.logger.info("MEMO hits %s misses %s size %s",
+                                 self.memo.hits, self.memo.misses, len(self.memo))
+
+            # If the user wants help, return the help and break
+            if "help" in self.args:
+
+                # We need to update so name_tag is tag (not logical I know)
+                self.params['tag'] = self.params.get('name_tag', self.getTag())
+                self.logger.info("User requested --help")
+                self.print_string_response(self.get_help())
+            else:
+                self.print_good_response([])
+
+        return False
+
+
+    @profiled
     def run(self, runFilter):
         '''the main run function is required to take a user runFilter function.
+           If it is an async function, we use run_async, and if nushell
+           started the plugin with --stdio, we use the persistent protocol.
+           With --signature, we save the signature file. runFilter can also
+           be a "module:function" string, imported when it's first called.
         '''
-        for line in fileinput.input():
-
-            x = json.loads(line)
+        if is_signature():
+            return self.export_signature()
+
+        runFilter = get_function(runFilter)
+        if is_persistent():
+            return PersistentServer(self, runFilter).run()
+
+        if is_coroutine_function(runFilter):
+            return self.run_async(runFilter)
+
+        metrics = self.metrics
+        tracer = self.tracer
+        lazy = isinstance(runFilter, LazyFunction)
+        self.reader = RequestReader()
+        lines = iter(self.reader)
+        start = time.perf_counter()
+        for index, line in enumerate(lines):
+
+            decoded = time.perf_counter()
+            x = self.codec.loads(line)
             method = x.get("method")
+            dispatched = time.perf_counter()
+            metrics.record("read", decoded - start, len(line))
+            metrics.record("decode", dispatched - decoded)
 
             # Keep log of requests from nu
-            self.logger.info("REQUEST %s" % line)
-            self.logger.info("METHOD %s" % method)
+            self.logger.info("REQUEST %s", line.decode)
+            self.logger.info("METHOD %s", method)
 
             # Store raw parameters for the plugin memory, only if not end filter
             if method != "end_filter":
                 self.params = x.get('params', {})
 
-            # Case 1: Nu is asking for the config to discover the plugin
-            if method == "config":
-                plugin_config = self.get_config()
-                self.logger.info("plugin-config: %s" % json.dumps(plugin_config))
-                self.print_good_response(plugin_config)
+            # A lazy function is loaded now, and if it's async we use run_async
+            if method == "filter" and lazy:
+                lazy = False
+                if is_coroutine_function(runFilter.resolve()):
+                    self.run_async(runFilter.resolve(), lines=itertools.chain([line], lines))
+                    break
+
+            # Run the filter, passing the unparsed params
+            proceed = True
+            if method == "filter":
+ 
+                self.logger.info("RAW PARAMS: %s", self.params)
+                if self.memo is None:
+                    self._run_filter(runFilter)
+                else:
+                    self._run_memo(runFilter)
+
+            else:
+                proceed = self._respond(method)
+
+            finished = time.perf_counter()
+            metrics.method(method, finished - dispatched)
+            if tracer is not None:
+                tracer.span("read", start, decoded)
+                tracer.span(method, decoded, finished, {"index": index, "bytes": len(line)})
+
+            if not proceed:
                 break
 
-            elif method == "begin_filter":
+            # Write responses if we would otherwise wait for input
+            self.writer.idle(self.reader)
+            start = time.perf_counter()
 
-                # Arguments only show up for begin_filter
-                self.args = self.parse_params(self.params)
-                self.logger.info("Begin Filter Args: %s" % self.args)
-                self.print_good_response([])
+        if self.memo is not None:
+            self.memo.close()
+
+        # Ensure that responses and queued log messages are written
+        self._flush()
+        if tracer is not None:
+            tracer.write()
+
+
+    def memoize(self, size=CACHE_SIZE, disk=False, ttl=None):
+        '''remember the responses printed by runFilter for up to size
+           different inputs (the least recently used are removed), and
+           print them again instead of calling runFilter for a repeated
+           input. An input is the primitive type and value, along with the
+           args from begin_filter. Only used by run.
+
+           Parameters
+           ==========
+           size: the maximum number of inputs to remember
+           disk: if True, remember responses in a DiskCache (see get_cache)
+                 shared by all runs of the plugin, instead of in memory
+           ttl: for a DiskCache, ignore responses older than ttl seconds
+        '''
+        if disk:
+            self.memo = self.get_cache(ttl=ttl, size=size)
+        else:
+            self.memo = MemoryCache(size)
 
-            # End filter can end the filter, OR call a custom sink function
-            elif method == "end_filter":
 
-                # If the user wants help, return the help and break
-                if "help" in self.args:
+    def no_cache(self):
+        '''called by runFilter so the responses for the current input are
+           not remembered (e.g., they depend on more than the value).
+        '''
+        self._cacheable = False
 
-                    # We need to update so name_tag is tag (not logical I know)
-                    self.params['tag'] = self.params.get('name_tag', self.getTag())
-                    self.logger.info("User requested --help")
-                    self.print_string_response(self.get_help())
+
+    def print_good_response(self, response):
+        '''print a good response, and record it if we are memoizing. If we
+           are capturing (persistent mode), we only record it.
+        '''
+        if self._recording is not None:
+            self._recording.append(response)
+            if self._capture:
+                return
+        super().print_good_response(response)
+
+
+    def _run_memo(self, runFilter):
+        '''call runFilter for the current params, unless we have the
+           responses for the same input. Responses are printed again with
+           the tag of the current params.
+        '''
+        key = (tuple(self.params["item"]["Primitive"].items()),
+               getattr(self, "_args_key", None))
+        try:
+            responses = self.memo.get(key)
+        except TypeError:
+            return self._run_filter(runFilter)
+
+        if responses is not MISSING:
+            for response in responses:
+                if isinstance(response, list):
+                    response = [self._retag(entry) for entry in response]
+                self.print_good_response(response)
+            return
+
+        # We might already be recording (e.g., in persistent mode)
+        recording, self._recording = self._recording, []
+        self._cacheable = True
+        try:
+            self._run_filter(runFilter)
+        finally:
+            responses, self._recording = self._recording, recording
+
+        if recording is not None:
+            recording.extend(responses)
+        if self._cacheable:
+            self.memo.set(key, responses)
+
+
+    def _run_entries(self, func, entries, mode="run", batch_size=BATCH_SIZE,
+                     executor=None, concurrency=CONCURRENCY):
+        '''handle filter requests for many entries at once (the values of a
+           call in persistent mode) with the function for a mode: run (a
+           runFilter, or an async one), batch, parallel or async.
+
+           Parameters
+           ==========
+           func: the runFilter, runBatch or runItem function
+           entries: the params (tag and item) of each filter request
+           mode: the run function the plugin was started with
+           batch_size: the most values to give runBatch at once (batch)
+           executor: the pool of processes to submit runItem to (parallel)
+           concurrency: the most calls of an async function at once
+        '''
+        if isinstance(func, LazyFunction):
+            func = func.resolve()
+        if mode == "run" and is_coroutine_function(func):
+            mode = "async"
+
+        if mode == "run":
+            for entry in entries:
+                self.params = entry
+                if self.memo is None:
+                    self._run_filter(func)
                 else:
-                    self.print_good_response([])
-                break
+                    self._run_memo(func)
+            return
+
+        if mode == "batch":
+            for start in range(0, len(entries), batch_size):
+                self._run_batch(func, entries[start:start + batch_size])
+            return
+
+        values = [next(iter(entry["item"]["Primitive"].values())) for entry in entries]
+        if mode == "parallel":
+            futures = [executor.submit(func, self.args, value) for value in values]
+            results = [future.result() for future in futures]
+        else:
+            results = self.run_coroutine(self.gather(
+                lambda value: func(self, self.args, value), values, concurrency))
 
-            # Run the filter, passing the unparsed params
-            elif method == "filter":
- 
-                self.logger.info("RAW PARAMS: %s" % self.params)
-                runFilter(self, self.args)
+        for entry, result in zip(entries, results):
+            self.print_result(result, entry)
+
+
+    def _retag(self, entry):
+        '''return a remembered response entry with the current tag
+        '''
+        value = entry.get("Ok", {}).get("Value") if isinstance(entry, dict) else None
+        if not isinstance(value, dict) or "item" not in value:
+            return entry
+        response = dict(self.params)
+        response["item"] = value["item"]
+        return {"Ok": {"Value": response}}
+
+
+    @profiled
+    def run_batch(self, runBatch, batch_size=BATCH_SIZE):
+        '''run the plugin in batch mode. Instead of calling a function for
+           each filter request, we collect the filter requests that are 
+           already available (up to batch_size) and call runBatch with
+           the plugin, params, and a list of primitive values. It must
+           return a list of results in the same order, each being a value
+           (the type is derived from the Python type), a tuple of
+           (value, primitive_type), or None to not return a value.
+        '''
+        runBatch = get_function(runBatch)
+        if is_persistent():
+            return PersistentServer(self, runBatch, mode="batch",
+                                    options={"batch_size": batch_size}).run()
+
+        self.reader = RequestReader()
+        batch = []
+        for line in self.reader:
+
+            x = self.codec.loads(line)
+            method = x.get("method")
+
+            # Keep log of requests from nu
+            self.logger.info("REQUEST %s", line.decode)
+            self.logger.info("METHOD %s", method)
+
+            # Wait for more filter requests if they are already available
+            if method == "filter":
+                batch.append(x.get('params', {}))
+                if len(batch) < batch_size and self.reader.ready():
+                    continue
+                self._run_batch(runBatch, batch)
+                batch = []
 
             else:
+
+                # Any other request must come after the filter responses
+                if batch:
+                    self._run_batch(runBatch, batch)
+                    batch = []
+
+                if method != "end_filter":
+                    self.params = x.get('params', {})
+
+                if not self._respond(method):
+                    break
+
+            # Write responses if we would otherwise wait for input
+            self.writer.idle(self.reader)
+
+        # Input can end without end_filter
+        if batch:
+            self._run_batch(runBatch, batch)
+
+        # Ensure that responses and queued log messages are written
+        self._flush()
+
+
+    def _run_batch(self, runBatch, batch):
+        '''call the user runBatch function with a list of primitive values
+           and print a response for each result.
+        '''
+        values = [list(params["item"]["Primitive"].values())[0]
+                  for params in batch]
+
+        # The last params are available to the function as self.params
+        self.params = batch[-1]
+        self.logger.info("BATCH of %s items", len(batch))
+        results = runBatch(self, self.args, values)
+
+        if results is None or len(results) != len(batch):
+            self.logger.exit("runBatch must return a result for each of %s values"
+                             % len(batch))
+
+        for params, result in zip(batch, results):
+            self.print_result(result, params)
+
+
+    def print_result(self, result, params):
+        '''print the response for a result returned by a batch or parallel
+           function: a value (the type is derived from the Python type), a
+           tuple of (value, primitive_type), None to not return a value,
+           or a list (or generator) of values to return many.
+        '''
+        if result is None:
+            return self.print_good_response([])
+
+        if isinstance(result, (list, types.GeneratorType)):
+            return self.print_values(result, params)
+
+        if isinstance(result, tuple):
+            value, primitive_type = result
+        else:
+            value, primitive_type = result, self.get_primitive_type(result)
+        self._print_primitive(value, primitive_type, params)
+
+
+    @profiled
+    def run_parallel(self, runItem, workers=None, window=None):
+        '''run the plugin with filter requests handled by a pool of processes.
+           runItem is called with the parsed params and the primitive value
+           (it doesn't get the plugin) and must return a result like a
+           run_batch function. It must be defined at the top level of your
+           script so it can be pickled. Responses are printed in the order
+           of the requests, and at most window items are in flight.
+
+           Parameters
+           ==========
+           runItem: the function to run for each filter request
+           workers: the number of processes, defaults to the number of cpus
+           window: the maximum number of items in flight (4 x workers)
+        '''
+        runItem = get_function(runItem)
+        workers = workers or os.cpu_count() or 1
+        window = window or workers * 4
+        inflight = collections.deque()
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        if is_persistent():
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return PersistentServer(self, runItem, mode="parallel",
+                                        options={"executor": executor}).run()
+
+        self.reader = RequestReader()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for line in self.reader:
+
+                x = self.codec.loads(line)
+                method = x.get("method")
+
+                # Keep log of requests from nu
+                self.logger.info("REQUEST %s", line.decode)
+                self.logger.info("METHOD %s", method)
+
+                if method == "filter":
+                    params = x.get('params', {})
+                    value = list(params["item"]["Primitive"].values())[0]
+                    inflight.append((params, executor.submit(runItem, self.args, value)))
+                    self._print_inflight(inflight, window)
+
+                    # If there isn't more input, nushell is waiting for responses
+                    if self.reader.ready():
+                        continue
+                    self._print_inflight(inflight)
+
+                else:
+
+                    # Any other request must come after the filter responses
+                    self._print_inflight(inflight)
+                    if method != "end_filter":
+                        self.params = x.get('params', {})
+
+                    if not self._respond(method):
+                        break
+
+                # Write responses if we would otherwise wait for input
+                self.writer.idle(self.reader)
+
+            # Input can end without end_filter
+            self._print_inflight(inflight)
+
+        # Ensure that responses and queued log messages are written
+        self._flush()
+
+
+    def _print_inflight(self, inflight, window=0):
+        '''print results for the items in flight (a deque of params and
+           futures) in order, while the first is done or there are more
+           than window items. The default (0) waits for all of them.
+        '''
+        while inflight and (len(inflight) > window or inflight[0][1].done()):
+            params, future = inflight.popleft()
+            self.print_result(future.result(), params)
+
+
+    @profiled
+    def run_async(self, runFilter, concurrency=CONCURRENCY, lines=None):
+        '''run the plugin with an async def runFilter, which is called with
+           the plugin, parsed params and the primitive value, and returns a
+           result like a run_batch function. Up to concurrency filter
+           requests are handled at once, and responses are printed in the
+           order of the requests.
+
+           Parameters
+           ==========
+           runFilter: the async function to run for each filter request
+           concurrency: the maximum number of filter requests at once
+           lines: the request lines left to handle, if run already started
+                  reading them (defaults to reading stdin)
+        '''
+        runFilter = get_function(runFilter)
+        if is_persistent():
+            return PersistentServer(self, runFilter, mode="async",
+                                    options={"concurrency": concurrency}).run()
+
+        if lines is None:
+            self.reader = RequestReader()
+            lines = self.reader
+        self.run_coroutine(self._run_async(runFilter, concurrency, lines))
+
+        # Ensure that responses and queued log messages are written
+        self._flush()
+
+
+    async def _run_async(self, runFilter, concurrency, lines):
+        '''read requests from stdin, and start a task for each filter. The
+           tasks are put on a queue for _print_tasks to print in order.
+        '''
+        import asyncio
+        lines = self.reader.queue(lines)
+        tasks = asyncio.Queue()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # A lazy function is imported at the first call (and then cached)
+        async def call(value):
+            try:
+                func = runFilter.resolve() if isinstance(runFilter, LazyFunction) else runFilter
+                return await func(self, self.args, value)
+            finally:
+                semaphore.release()
+
+        async def read():
+            while True:
+                line = await lines.get()
+                if line is None:
+                    break
+
+                x = self.codec.loads(line)
+                method = x.get("method")
+
+                # Keep log of requests from nu
+                self.logger.info("REQUEST %s", line.decode)
+                self.logger.info("METHOD %s", method)
+
+                if method == "filter":
+                    params = x.get('params', {})
+                    value = list(params["item"]["Primitive"].values())[0]
+                    await semaphore.acquire()
+                    tasks.put_nowait((params, asyncio.ensure_future(call(value))))
+                    continue
+
+                # Any other request must come after the filter responses
+                await tasks.join()
+                if method != "end_filter":
+                    self.params = x.get('params', {})
+
+                if not self._respond(method):
+                    break
+
+                # Write responses if we would otherwise wait for input
+                if lines.empty():
+                    self.writer.flush()
+
+            tasks.put_nowait(None)
+
+        await asyncio.gather(read(), self._print_tasks(tasks, lines))
+
+
+    async def _print_tasks(self, tasks, lines):
+        '''print the result of each task in order, until we get None
+        '''
+        while True:
+            item = await tasks.get()
+            if item is None:
                 break
+            params, task = item
+            self.print_result(await task, params)
+            tasks.task_done()
+
+            # Write responses if we would otherwise wait for input
+            if tasks.empty() and lines.empty():
+                self.writer.flush()
@@ -0,0 +1,88 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import importlib
+import types
+
+# The code flag of an async def function (inspect.CO_COROUTINE). We check it
+# instead of importing asyncio (or inspect), which slows down every start.
+CO_COROUTINE = 0x80
+
+
+def is_coroutine_function(func):
+    '''return True if func is an async def function (or method)
+    '''
+    code = getattr(getattr(func, "__func__", func), "__code__", None)
+    return code is not None and bool(code.co_flags & CO_COROUTINE)
+
+
+class LazyFunction:
+
+    def __init__(self, spec):
+        '''a LazyFunction stands in for a sink or filter function, and only
+           imports it (and whatever it imports) the first time it's called.
+           Nushell asks for the config and --help without calling it, so
+           these don't pay for heavy imports. A LazyFunction can be pickled
+           (for run_parallel) if the spec is a string.
+
+           Parameters
+           ==========
+           spec: a string "module:function" (e.g., "nu_pokemon:sink") or a
+                 function that takes no arguments, does the imports, and
+                 returns the function (so it can be used as a decorator)
+        '''
+        if isinstance(spec, str) and ":" not in spec:
+            raise ValueError("%s should be in the format module:function" % spec)
+        self.spec = spec
+        self._func = None
+
+
+    def resolve(self):
+        '''import (or load) the function, only once
+        '''
+        if self._func is None:
+            if isinstance(self.spec, str):
+                module, name = self.spec.split(":", 1)
+                func = importlib.import_module(module)
+                for attr in name.split("."):
+                    func = getattr(func, attr)
+            else:
+                func = self.spec()
+            self._func = func
+        return self._func
+
+
+    def __call__(self, *args, **kwargs):
+        '''call the function. We can't know if it's async until it's
+           loaded, so a coroutine is run here until it's complete.
+        '''
+        result = self.resolve()(*args, **kwargs)
+        if isinstance(result, types.CoroutineType):
+            import asyncio
+            loop = asyncio.new_event_loop()
+            try:
+                return loop.run_until_complete(result)
+            finally:
+                loop.close()
+        return result
+
+
+    def __getstate__(self):
+        return {"spec": self.spec, "_func": None}
+
+
+    def __repr__(self):
+        return "LazyFunction(%r)" % (self.spec,)
+
+
+def get_function(func):
+    '''return a LazyFunction for a "module:function" string, otherwise the
+       function as is. This lets plugin.run take either.
+    '''
+    if isinstance(func, str):
+        return LazyFunction(func)
+    return func
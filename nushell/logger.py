@@ -5,8 +5,11 @@
 # Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import atexit
 import os
+import queue
 import sys
+import threading
 
 ABORT = -5
 CRITICAL = -4
@@ -27,6 +30,10 @@ RED = "\033[91m"
 DARKRED = "\033[31m"
 CYAN = "\033[36m"
 
+# Background writer defaults (number of queued messages, and seconds)
+QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 0.5
+
 
 class NushellLogger:
 
@@ -43,6 +50,7 @@ class NushellLogger:
         '''
         self.level = get_logging_level(level)
         self.logfile = logfile
+        self.writer = None
         self.errorStream = sys.stderr
         self.outputStream = sys.stdout
         self.colorize = self.useColor()
@@ -116,17 +124,26 @@ class NushellLogger:
         return messageLevel <= self.level and not self.is_quiet()
 
 
-    def emit(self, level, message, prefix=None, color=None):
+    def emit(self, level, message, prefix=None, color=None, args=None):
         '''emit is the main function to print the message
            optionally with a prefix. If we have a logfile, we print
-           to it instead.
+           to it instead. Nothing is formatted unless the level is enabled,
+           so callers should pass arguments (args) instead of formatting
+           the message themselves.
 
            Parameters
            ==========
            level: the level of the message
-           message: the message to print
+           message: the message to print (or a callable to return it)
            prefix: a prefix for the message
+           args: arguments to format into the message with %, any that
+                 are callable are called to get the value
         '''
+        if not self.isEnabledFor(level):
+            return
+
+        message = self.format(message, args)
+
         if color is None:
             color = level
 
@@ -143,15 +160,27 @@ class NushellLogger:
             message = "%s\n" % message
 
         # Case 1: print logs to file (must be enabled and not quiet)
-        if self.logfile and self.isEnabledFor(level):
+        if self.logfile:
             self.writeFile(message)
 
         # Otherwise if in range, not quiet, print to stdout and stderr
-        elif self.isEnabledFor(level):
-            if self.emitError(level):
-                self.write(self.errorStream, message)
-            else:
-                self.write(self.outputStream, message)
+        elif self.emitError(level):
+            self.write(self.errorStream, message)
+        else:
+            self.write(self.outputStream, message)
+
+
+    def format(self, message, args=None):
+        '''format a message with deferred arguments. The message itself,
+           or any of the arguments, can be a callable that returns the value.
+        '''
+        if callable(message):
+            message = message()
+
+        if args:
+            args = tuple(arg() if callable(arg) else arg for arg in args)
+            message = message % args
+        return message
 
     def write(self, stream, message):
         '''write a message to a stream, and check the encoding
@@ -162,60 +191,81 @@ class NushellLogger:
 
 
     def writeFile(self, message):
-        '''write a message to a stream, and check the encoding
+        '''write a message to the logfile. Messages are handed to a
+           background LogWriter (started on first use) so that we don't
+           open and close the file for every message.
         '''
         if isinstance(message, bytes):
             message = message.decode('utf-8')
 
-        with open(self.logfile, 'a') as filey:
-            filey.writelines(message)
+        if self.writer is None:
+            self.writer = LogWriter(self.logfile)
+        self.writer.write(message)
+
+
+    def flush(self):
+        '''block until all queued messages are written to the logfile
+        '''
+        if self.writer is not None:
+            self.writer.flush()
+
+
+    def close(self):
+        '''flush remaining messages, stop the writer and close the logfile
+        '''
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
 
 
     # Logging ------------------------------------------
 
 
-    def abort(self, message):
-        self.emit(ABORT, message, 'ABORT')
+    def abort(self, message, *args):
+        self.emit(ABORT, message, 'ABORT', args=args)
 
-    def critical(self, message):
-        self.emit(CRITICAL, message, 'CRITICAL')
+    def critical(self, message, *args):
+        self.emit(CRITICAL, message, 'CRITICAL', args=args)
 
-    def error(self, message):
-        self.emit(ERROR, message, 'ERROR')
+    def error(self, message, *args):
+        self.emit(ERROR, message, 'ERROR', args=args)
 
-    def exit(self, message, return_code=1):
-        self.emit(ERROR, message, 'ERROR')
+    # The return code (and color) come before the args, as they did before
+    # the args were added, so existing positional calls still work.
+    def exit(self, message, return_code=1, *args): # pylint: disable=keyword-arg-before-vararg
+        self.emit(ERROR, message, 'ERROR', args=args)
+        self.flush()
         sys.exit(return_code)
 
-    def warning(self, message):
-        self.emit(WARNING, message, 'WARNING')
+    def warning(self, message, *args):
+        self.emit(WARNING, message, 'WARNING', args=args)
 
-    def log(self, message):
-        self.emit(LOG, message, 'LOG')
+    def log(self, message, *args):
+        self.emit(LOG, message, 'LOG', args=args)
 
-    def custom(self, prefix, message="", color=PURPLE):
-        self.emit(CUSTOM, message, prefix, color)
+    def custom(self, prefix, message="", color=PURPLE, *args): # pylint: disable=keyword-arg-before-vararg
+        self.emit(CUSTOM, message, prefix, color, args=args)
 
-    def info(self, message):
-        self.emit(INFO, message)
+    def info(self, message, *args):
+        self.emit(INFO, message, args=args)
 
     def newline(self):
         return self.info("")
 
-    def verbose(self, message):
-        self.emit(VERBOSE, message, "VERBOSE")
+    def verbose(self, message, *args):
+        self.emit(VERBOSE, message, "VERBOSE", args=args)
 
-    def verbose1(self, message):
-        self.emit(VERBOSE, message, "VERBOSE1")
+    def verbose1(self, message, *args):
+        self.emit(VERBOSE, message, "VERBOSE1", args=args)
 
-    def verbose2(self, message):
-        self.emit(VERBOSE2, message, 'VERBOSE2')
+    def verbose2(self, message, *args):
+        self.emit(VERBOSE2, message, 'VERBOSE2', args=args)
 
-    def verbose3(self, message):
-        self.emit(VERBOSE3, message, 'VERBOSE3')
+    def verbose3(self, message, *args):
+        self.emit(VERBOSE3, message, 'VERBOSE3', args=args)
 
-    def debug(self, message):
-        self.emit(DEBUG, message, 'DEBUG')
+    def debug(self, message, *args):
+        self.emit(DEBUG, message, 'DEBUG', args=args)
 
     def is_quiet(self):
         '''is_quiet returns true if the level is 0
@@ -223,10 +273,99 @@ class NushellLogger:
         return self.level == QUIET
 
 
+class LogWriter:
+
+    def __init__(self, logfile, maxsize=QUEUE_SIZE, interval=FLUSH_INTERVAL):
+        '''a LogWriter keeps a persistent (appending) handle to a logfile,
+           and drains messages from a bounded queue in a background thread.
+           Messages that are available together are written in one batch.
+           If the queue is full, writing blocks until there is room, and
+           an exit handler ensures that everything is written at exit.
+
+           Parameters
+           ==========
+           logfile: the path to the logfile to append to
+           maxsize: the maximum number of messages to hold in the queue
+           interval: seconds to wait before flushing the file handle
+        '''
+        self.logfile = logfile
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.handle = open(logfile, 'a')
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+
+    def write(self, message):
+        '''add a message to the queue (blocks if the queue is full)
+        '''
+        if self.handle is not None:
+            self.queue.put(message)
+
+
+    def flush(self):
+        '''wait for all queued messages to be written, and flush the file
+        '''
+        if self.handle is None:
+            return
+        self.queue.join()
+        with self.lock:
+            if self.handle is not None:
+                self.handle.flush()
+
+
+    def close(self):
+        '''flush and close the logfile, and stop the background thread
+        '''
+        if self.handle is None:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        with self.lock:
+            self.handle.close()
+            self.handle = None
+        atexit.unregister(self.close)
+
+
+    def _drain(self):
+        '''the background thread takes all available messages from the
+           queue, and writes them to the file handle together. The handle
+           is flushed when the queue has been idle for the flush interval.
+        '''
+        while True:
+            try:
+                message = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                with self.lock:
+                    if self.handle is not None:
+                        self.handle.flush()
+                continue
+
+            batch = [message]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None is the signal to stop
+            messages = [m for m in batch if m is not None]
+            with self.lock:
+                self.handle.writelines(messages)
+            for _ in batch:
+                self.queue.task_done()
+
+            if len(messages) != len(batch):
+                break
+
+
 def get_logging_level(default_level=None):
     '''get_logging_level based on an int or user specific string, default INFO
     '''
-    if not default_level:
+    if default_level is None:
         default_level = DEBUG
     level = os.environ.get("MESSAGELEVEL", default_level)
 
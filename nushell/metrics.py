@@ -0,0 +1,115 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import bisect
+import json
+import os
+
+# Phases of handling a request: waiting for it, json, the plugin, output
+PHASES = ["read", "decode", "dispatch", "encode", "write"]
+
+# Methods we expect from nushell (others are added when we see them)
+METHODS = ["config", "begin_filter", "filter", "end_filter", "sink"]
+
+# Upper bounds of the histogram buckets, in microseconds (the last is more)
+BUCKETS = [10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000]
+
+
+class Histogram:
+    '''a Histogram counts latencies in fixed buckets (see BUCKETS), and
+       keeps the count, total and maximum. Nothing is allocated to record.
+    '''
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds * 1e6)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        '''return the count, mean and max (microseconds) and the buckets
+           that aren't empty, as {"<=100us": 2, ">1000000us": 1}
+        '''
+        buckets = {}
+        for index, count in enumerate(self.counts):
+            if count:
+                if index < len(BUCKETS):
+                    buckets["<=%sus" % BUCKETS[index]] = count
+                else:
+                    buckets[">%sus" % BUCKETS[-1]] = count
+        return {"count": self.count,
+                "mean_us": round(self.total / self.count * 1e6, 1) if self.count else 0,
+                "max_us": round(self.max * 1e6, 1),
+                "buckets": buckets}
+
+
+class Metrics:
+
+    def __init__(self):
+        '''Metrics keeps a latency histogram for each phase of handling a
+           request (read, decode, dispatch, encode, write) and for each
+           json-rpc method (the dispatch time), along with the bytes read
+           and written. It's cheap enough to always be on, and the plugin
+           dumps a summary to the log (and NU_PLUGIN_STATS, if set) at the
+           end of a filter or sink.
+        '''
+        self.phases = dict((phase, Histogram()) for phase in PHASES)
+        self.methods = dict((method, Histogram()) for method in METHODS)
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+
+    def record(self, phase, seconds, size=0):
+        '''record the seconds of a phase, and for read or write, the bytes
+        '''
+        self.phases[phase].record(seconds)
+        if phase == "read":
+            self.bytes_read += size
+        elif phase == "write":
+            self.bytes_written += size
+
+
+    def method(self, method, seconds):
+        '''record a request for a method, and the seconds to dispatch it
+           (the dispatch phase, which includes encoding the response)
+        '''
+        histogram = self.methods.get(method)
+        if histogram is None:
+            histogram = self.methods[method] = Histogram()
+        histogram.record(seconds)
+        self.phases["dispatch"].record(seconds)
+
+
+    def summary(self):
+        '''return a dictionary with the phases and methods that were seen
+        '''
+        return {"phases": dict((name, histogram.summary()) for name, histogram
+                               in self.phases.items() if histogram.count),
+                "methods": dict((name, histogram.summary()) for name, histogram
+                                in self.methods.items() if histogram.count),
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written}
+
+
+    def dump(self, logger, path=None):
+        '''write the summary to the log, and to a stats file (path, or the
+           environment variable NU_PLUGIN_STATS) if defined. A stats file
+           gets one line of json for each dump.
+        '''
+        logger.info("METRICS %s", lambda: json.dumps(self.summary()))
+        path = path or os.environ.get("NU_PLUGIN_STATS")
+        if path:
+            with open(path, 'a', encoding='utf-8') as filey:
+                filey.write(json.dumps(self.summary()) + "\n")
@@ -0,0 +1,393 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Newer versions of nushell start a plugin once with --stdio, and then send
+# it many calls (each with an id) until Goodbye. Values look like
+# {"String": {"val": "pancakes", "span": {"start": 0, "end": 2}}} instead
+# of the tag and item (Primitive) of the older json-rpc requests, so we
+# convert between the two and user functions work the same for both.
+
+from nushell.codec import get_encoding
+from nushell.reader import RequestReader
+from nushell.version import __version__
+
+import contextlib
+import io
+import os
+import sys
+
+# Exit if there isn't a call for this many seconds (nushell starts us again)
+IDLE_TIMEOUT = 600
+
+PROTOCOL = "nu-plugin"
+
+# The protocol version we say Hello with (NU_PLUGIN_PROTOCOL_VERSION)
+PROTOCOL_VERSION = "0.92.0"
+
+# Value types in the persistent protocol, and the older primitive types
+TYPES = {"Bool": "Boolean", "Float": "Decimal", "Filesize": "Bytes"}
+PRIMITIVES = dict((value, key) for key, value in TYPES.items())
+
+# SyntaxShapes to the shapes of the persistent protocol signature
+SHAPES = {"Member": "String", "Pattern": "GlobPattern", "Path": "Filepath",
+          "Block": "Closure", "List": {"List": "Any"}}
+
+
+def is_persistent(argv=None):
+    '''nushell starts a plugin with --stdio to use the persistent protocol
+    '''
+    return "--stdio" in (sys.argv if argv is None else argv)
+
+
+def get_header(encoding):
+    '''the encoding is sent first, as a length and then the name
+    '''
+    name = encoding.encode('utf-8')
+    return bytes([len(name)]) + name
+
+
+def to_entry(value):
+    '''convert a persistent protocol value to the tag and item of a json-rpc
+       request, e.g., {"tag": {...}, "item": {"Primitive": {"String": "a"}}}
+    '''
+    value_type, content = next(iter(value.items()))
+    content = content or {}
+    tag = {"anchor": None, "span": content.get("span") or {"start": 0, "end": 0}}
+    primitive_type = TYPES.get(value_type, value_type)
+    return {"tag": tag, "item": {"Primitive": {primitive_type: content.get("val")}}}
+
+
+def to_value(entry, span=None):
+    '''convert the tag and item of a response entry to a persistent
+       protocol value. A list of entries (or a Table) becomes a List value,
+       and a Row a Record.
+    '''
+    if isinstance(entry, list):
+        return {"List": {"vals": [to_value(item, span) for item in entry],
+                         "span": span}}
+
+    span = entry.get("tag", {}).get("span", span)
+    item = entry.get("item", {})
+    if "Row" in item:
+        entries = item["Row"].get("entries", {})
+        return {"Record": {"val": dict((name, to_value(value, span))
+                                       for name, value in entries.items()),
+                           "span": span}}
+    if "Table" in item:
+        return to_value(item["Table"], span)
+
+    primitive = item.get("Primitive", {"Nothing": None})
+    primitive_type, value = next(iter(primitive.items()))
+    value_type = PRIMITIVES.get(primitive_type, primitive_type)
+    if value_type == "Nothing":
+        return {"Nothing": {"span": span}}
+    return {value_type: {"val": value, "span": span}}
+
+
+def get_values(value):
+    '''return the list of values in a value (the vals of a List)
+    '''
+    if value is None:
+        return []
+    if "List" in value:
+        return value["List"].get("vals", [])
+    return [value]
+
+
+def get_error(message):
+    '''return an Error response with a message
+    '''
+    return {"Error": {"msg": message, "labels": [], "code": None, "url": None,
+                      "help": None, "inner": []}}
+
+
+class PersistentServer:
+
+    def __init__(self, plugin, func, idle_timeout=None, encoding=None, mode="run",
+                 options=None):
+        '''a PersistentServer answers calls from nushell for a filter or
+           sink plugin, with the user function, until nushell says
+           Goodbye, stdin ends, or there isn't a call for idle_timeout
+           seconds (NU_PLUGIN_IDLE_TIMEOUT).
+
+           Parameters
+           ==========
+           plugin: the FilterPlugin or SinkPlugin
+           func: the runFilter or sink function of the plugin
+           idle_timeout: seconds to wait for a call before exiting
+           encoding: json or msgpack, defaults to NU_PLUGIN_ENCODING or json
+           mode: for a filter, the run function it was started with (run,
+                 batch, parallel or async) to call func the same way
+           options: keyword arguments for the mode (e.g., batch_size)
+        '''
+        self.plugin = plugin
+        self.func = func
+        self.mode = mode
+        self.options = options or {}
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get("NU_PLUGIN_IDLE_TIMEOUT", IDLE_TIMEOUT))
+        self.idle_timeout = idle_timeout
+        self.codec = get_encoding(encoding, plugin.codec, plugin.logger)
+        self.reader = RequestReader()
+        self.pending = 0
+
+
+    def send(self, message):
+        '''write a message to nushell right away
+        '''
+        self.plugin.writer.write(self.codec.frame(message))
+        self.plugin.writer.flush()
+
+
+    def decode(self):
+        '''yield each message from nushell. Json messages are lines, and
+           msgpack messages are fed to an unpacker as bytes arrive.
+        '''
+        if not self.codec.binary:
+            for line in self.reader:
+                yield self.codec.loads(line)
+            return
+
+        unpacker = self.codec.unpacker()
+        for chunk in self.reader.chunks():
+            unpacker.feed(chunk)
+            messages = list(unpacker)
+            self.pending = len(messages)
+            for message in messages:
+                self.pending -= 1
+                yield message
+
+
+    def messages(self):
+        '''yield messages from nushell, stopping when we are idle too long
+        '''
+        decoded = self.decode()
+        while True:
+            if self.idle_timeout and self._selectable() and not self.ready():
+                self.plugin.logger.info("No call for %s seconds, exiting",
+                                        self.idle_timeout)
+                return
+            try:
+                message = next(decoded)
+            except StopIteration:
+                return
+            yield message
+
+
+    def ready(self):
+        '''return True if a message is ready, waiting up to idle_timeout
+        '''
+        return self.pending > 0 or self.reader.ready(self.idle_timeout)
+
+
+    def _selectable(self):
+        try:
+            self.reader.stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            return False
+        return True
+
+
+    def run(self):
+        '''send the encoding and Hello, and then answer calls until done.
+           Nushell reads both before it sends anything, so we don't wait.
+        '''
+        self.plugin.writer.write(get_header(self.codec.encoding))
+        version = os.environ.get("NU_PLUGIN_PROTOCOL_VERSION", PROTOCOL_VERSION)
+        self.send({"Hello": {"protocol": PROTOCOL, "version": version, "features": []}})
+        messages = self.messages()
+        for message in messages:
+
+            self.plugin.logger.info("MESSAGE %s", message)
+            if message == "Goodbye":
+                break
+
+            if not isinstance(message, dict):
+                continue
+
+            # Nushell checks that our version is compatible with its own
+            if "Hello" in message:
+                self.plugin.logger.info("Nushell protocol version %s",
+                                        message["Hello"].get("version"))
+
+            elif "Call" in message:
+                call_id, call = message["Call"]
+                self.send({"CallResponse": [call_id, self.respond(call, messages)]})
+
+        self.plugin.writer.flush()
+        self.plugin.logger.flush()
+
+
+    def respond(self, call, messages):
+        '''return the response for a call
+        '''
+        if call == "Signature":
+            return {"Signature": [{"sig": self.get_signature(), "examples": []}]}
+
+        if call == "Metadata":
+            return {"Metadata": {"version": __version__}}
+
+        if isinstance(call, dict) and "Run" in call:
+            try:
+                return {"PipelineData": {"Value": self.run_call(call["Run"], messages)}}
+            except Exception as exc:
+                self.plugin.logger.error("%s", exc)
+                return get_error(str(exc))
+
+        return get_error("Unsupported call %s" % call)
+
+
+# Signature
+
+    def get_signature(self):
+        '''convert the plugin configuration to a signature
+        '''
+        config = self.plugin.get_config()
+        signature = {"name": config["name"],
+                     "usage": config["usage"],
+                     "description": config["usage"],
+                     "extra_usage": "",
+                     "extra_description": "",
+                     "search_terms": [],
+                     "required_positional": [],
+                     "optional_positional": [],
+                     "rest_positional": None,
+                     "named": [],
+                     "input_output_types": [["Any", "Any"]],
+                     "allow_variants_without_examples": True,
+                     "vectorizes_over_list": False,
+                     "allows_unknown_args": False,
+                     "is_filter": config["is_filter"],
+                     "creates_scope": False,
+                     "category": "Default"}
+
+        for positional in config["positional"]:
+            argType, values = next(iter(positional.items()))
+            name = values[0]
+            shape = values[1] if len(values) > 1 else "Any"
+            key = "required_positional" if argType == "Mandatory" else "optional_positional"
+            signature[key].append({"name": name,
+                                   "desc": self.plugin.argUsage.get(name, ""),
+                                   "shape": SHAPES.get(shape, shape),
+                                   "var_id": None,
+                                   "default_value": None})
+
+        for name, argType in config["named"].items():
+            flag = {"long": name, "short": None, "arg": None, "required": False,
+                    "desc": self.plugin.argUsage.get(name, ""),
+                    "var_id": None, "default_value": None}
+            if isinstance(argType, dict):
+                required, shape = next(iter(argType.items()))
+                flag["arg"] = SHAPES.get(shape, shape)
+                flag["required"] = required == "Mandatory"
+            signature["named"].append(flag)
+        return signature
+
+
+# Running
+
+    def get_params(self, call):
+        '''convert the positional and named arguments of a call to the
+           params of a json-rpc request (to parse with parse_params)
+        '''
+        head = call.get("head") or {"start": 0, "end": 0}
+        positional = [to_entry(value) for value in call.get("positional") or []]
+        named = {}
+        for name, value in call.get("named") or []:
+            name = name.get("item") if isinstance(name, dict) else name
+
+            # A switch doesn't have a value
+            if value is None:
+                value = {"Bool": {"val": True, "span": head}}
+            named[name] = to_entry(value)
+
+        return {"args": {"positional": positional, "named": named},
+                "name_tag": {"anchor": None, "span": head}}
+
+
+    def get_input(self, data, messages):
+        '''return the list of input values for the pipeline data of a call,
+           collecting the values of a list stream from Data messages.
+        '''
+        if not isinstance(data, dict):
+            return []
+
+        if "Value" in data:
+            value = data["Value"]
+
+            # Newer versions send the value with metadata
+            if isinstance(value, list):
+                value = value[0]
+            return get_values(value)
+
+        if "ListStream" not in data:
+            return []
+
+        stream_id = data["ListStream"]["id"]
+        values = []
+        for message in messages:
+            if isinstance(message, dict) and "Data" in message:
+                data_id, data = message["Data"]
+                if data_id == stream_id:
+                    values.append(data.get("List", data))
+                    self.send({"Ack": stream_id})
+            elif isinstance(message, dict) and message.get("End") == stream_id:
+                self.send({"Drop": stream_id})
+                break
+        return values
+
+
+    def run_call(self, run, messages):
+        '''run the plugin function for a call, and return the output value
+        '''
+        call = run.get("call", {})
+        head = call.get("head") or {"start": 0, "end": 0}
+        params = self.get_params(call)
+        values = self.get_input(run.get("input"), messages)
+        plugin = self.plugin
+
+        # A filter saves the args for each value, a sink gets them as params
+        if plugin.is_filter:
+            plugin.set_args(params)
+            args = plugin.args
+        else:
+            args = plugin.parse_params(params)
+
+        # The user asked for --help
+        if args.get("help", False):
+            return {"String": {"val": plugin.get_help(), "span": head}}
+
+        if not plugin.is_filter:
+            args["_pipe"] = [next(iter(to_entry(value)["item"]["Primitive"].values()))
+                             for value in values]
+
+            # Anything the sink prints is the output
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                plugin._run_sink(self.func, args)
+            return {"String": {"val": output.getvalue(), "span": head}}
+
+        # A filter prints responses for each value, we capture them
+        plugin._recording = []
+        plugin._capture = True
+        try:
+            plugin._run_entries(self.func, [to_entry(value) for value in values],
+                                self.mode, **self.options)
+        finally:
+            responses, plugin._recording = plugin._recording, None
+            plugin._capture = False
+
+        outputs = []
+        for response in responses:
+            for entry in response if isinstance(response, list) else []:
+                value = entry.get("Ok", {}).get("Value")
+                if value is not None:
+                    outputs.append(to_value(value, head))
+
+        if len(outputs) == 1 and len(values) == 1:
+            return outputs[0]
+        return {"List": {"vals": outputs, "span": head}}
@@ -6,12 +6,24 @@
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+from nushell.cache import DiskCache
+from nushell.codec import get_codec
+from nushell.decoders import get_decoder, get_value
 from nushell.logger import NushellLogger
+from nushell.metrics import Metrics
+from nushell.signature import write_signature
+from nushell.trace import get_tracer
+from nushell.writer import ResponseWriter
 
+import hashlib
 import json
 import os
-import sys
+import re
 import tempfile
+import time
+
+# Default number of coroutines to run at once for async functions
+CONCURRENCY = 16
 
 
 class PluginBase:
@@ -19,7 +31,8 @@ class PluginBase:
        a sink and filter plugin
     '''
     def __init__(self, name, usage, 
-                 logging=True, add_help=True, parse_params=True):
+                 logging=True, add_help=True, parse_params=True,
+                 codec=None, flush=None, flush_size=None):
 
         '''Set the name and usage to generate the configuration
 
@@ -30,6 +43,11 @@ class PluginBase:
            logging: if True, will output logfile to /tmp/nu_plugin_<name>.log
            add_help: if True, adds a custom --help command (unless defined)
            parse_params: extract values from "args" (don't return raw)
+           codec: json library to use (auto, json, orjson, ujson, simdjson)
+                  defaults to NU_PLUGIN_CODEC, or the fastest installed
+           flush: when to write responses (always, idle, size) defaults
+                  to NU_PLUGIN_FLUSH, or idle (when no more input is ready)
+           flush_size: bytes to buffer before writing for the size policy
         '''
         self.name = self._clean_name(name)
         self.usage = usage
@@ -38,9 +56,16 @@ class PluginBase:
         self.rest_positional = None
         self.named = {}
         self.argUsage = {}
+        self._decoders = None
         self.logger = self.get_logger(logging)
         self.add_help = add_help
         self._parse_params = parse_params
+        self.codec = get_codec(codec, self.logger)
+        self.writer = ResponseWriter(flush, flush_size)
+        self.metrics = Metrics()
+        self.writer.metrics = self.metrics
+        self.tracer = get_tracer(self.logger.logfile)
+        self.writer.tracer = self.tracer
 
 # Arguments
 
@@ -83,12 +108,13 @@ class PluginBase:
 
         # Add to list of names, we use this to add to --help
         self._positional.append(arg['name'])
+        self._decoders = None
 
         # Add the usage, if defined
         if usage is not None:
             self.argUsage[arg['name']] = usage
 
-        self.logger.debug("Updated positional arguments %s" % self._positional)
+        self.logger.debug("Updated positional arguments %s", self._positional)
 
 
     def add_named_argument(self, name, argType, syntaxShape=None, usage=None):
@@ -115,12 +141,13 @@ class PluginBase:
             self.named[arg['name']] = "Switch"
         elif arg['type'] in ["Optional", "Mandatory"]:
             self.named[arg['name']] = {arg['type']: arg['shape']}
+        self._decoders = None
 
         # Add usage, if provided
         if usage:
             self.argUsage[arg['name']] = usage
 
-        self.logger.debug("Updated named arguments %s" % self.named)
+        self.logger.debug("Updated named arguments %s", self.named)
 
 
     def _get_syntax_shape(self, shape):
@@ -133,7 +160,7 @@ class PluginBase:
                   "Number", "Int", "Path", "Pattern", "Block"]
 
         if shape not in shapes:
-            self.logger.warning("%s is not a valid SyntaxShape" % shape)
+            self.logger.warning("%s is not a valid SyntaxShape", shape)
             return "String"
         return shape
 
@@ -150,6 +177,24 @@ class PluginBase:
         return NushellLogger(logfile)
 
 
+    def get_cache(self, ttl=None, size=None):
+        '''return a DiskCache, an sqlite database next to the logfile named
+           nu_plugin_<name>.cache that is shared by all runs of the plugin.
+           Results are saved with a version from the plugin configuration,
+           so if the plugin arguments change, older results are ignored.
+
+           Parameters
+           ==========
+           ttl: if defined, results older than ttl seconds are ignored
+           size: if defined, keep at most this many results
+        '''
+        cachename = "nu_plugin_%s.cache" % self.name
+        cachefile = os.path.join(tempfile.gettempdir(), cachename)
+        config = json.dumps(self.get_config(), sort_keys=True)
+        version = hashlib.sha256(config.encode('utf-8')).hexdigest()
+        return DiskCache(cachefile, version, ttl=ttl, size=size)
+
+
     def get_good_response(self, response):
         '''generate a good response. Confirming to jsonprc 2.0, we include a 
            method "response" and params that should be a dict with key "Ok" and 
@@ -165,12 +210,50 @@ class PluginBase:
 
 
     def print_good_response(self, response):
-        '''generate and print a good response.
+        '''generate and print a good response. The response is given to the
+           writer, which decides when to write it out based on the policy.
         '''
         json_response = self.get_good_response(response)
-        self.logger.info("Printing response %s" % response)
-        print(json.dumps(json_response))
-        sys.stdout.flush()
+        self.logger.info("Printing response %s", response)
+        start = time.perf_counter()
+        data = self.codec.encode(json_response) + b"\n"
+        self.metrics.record("encode", time.perf_counter() - start)
+        self.writer.write(data)
+
+
+# Async
+
+    def run_coroutine(self, coroutine):
+        '''run a coroutine (e.g., from an async def sink) on a new event
+           loop until it is complete, and return the result.
+        '''
+        import asyncio
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+
+    async def gather(self, func, values, concurrency=CONCURRENCY):
+        '''call an async function for each value, with at most concurrency
+           calls at once, and return the list of results in order. This can
+           be used by an async sink for the values in _pipe. Values can be
+           any iterable (e.g., a streamed _pipe) and are only taken from it
+           as a worker is free, so it's never read far ahead of the calls.
+        '''
+        import asyncio
+        results = []
+        items = enumerate(values)
+
+        # Each worker takes the next value (and its slot) when it's free
+        async def work():
+            for index, value in items:
+                results.append(None)
+                results[index] = await func(value)
+
+        await asyncio.gather(*[work() for _ in range(concurrency)])
+        return results
 
 
 # Configuration
@@ -186,6 +269,8 @@ class PluginBase:
             self.named['help'] = "Switch"
             self.argUsage['help'] = "show this usage"
 
+        # The arguments are known now, so we compile their decoders
+        self._decoders = self.get_decoders()
         return {
             "name": self.name,
             "usage": self.usage,
@@ -195,8 +280,51 @@ class PluginBase:
             "is_filter": self.is_filter}
 
 
+    def export_signature(self, path=None):
+        '''save the configuration to a signature file, so that later runs
+           can answer config from it (see nushell.signature.answer_config)
+           without importing anything else. This is done when the plugin
+           is run with --signature, and we print the path.
+        '''
+        path = write_signature(self.get_config(), path=path)
+        self.logger.info("Wrote signature to %s", path)
+        print(path)
+        return path
+
+
 # Parsing, Help and Tags
 
+    def get_decoders(self):
+        '''return a decoder (see nushell.decoders) for each named argument
+           (a dictionary) and positional argument (a list) from the declared
+           SyntaxShape, e.g., an Int is parsed to an int and a Path to a
+           pathlib.Path. This is done once, when we get the config (or
+           first parse params) so parsing is a lookup for each argument.
+        '''
+        named = {}
+        for name, argType in self.named.items():
+            if isinstance(argType, dict):
+                argType = next(iter(argType.values()))
+            named[name] = get_decoder(argType)
+
+        positional = []
+        for arg in self.positional:
+            values = next(iter(arg.values()))
+            positional.append(get_decoder(values[1] if len(values) > 1 else "Any"))
+        return named, positional
+
+
+    def decode(self, decoder, name, primitive):
+        '''decode a primitive for an argument, or return the value as it is
+           (and log) if it doesn't match the declared SyntaxShape
+        '''
+        try:
+            return decoder(primitive)
+        except (ValueError, TypeError, ArithmeticError, re.error) as exc:
+            self.logger.info("Cannot decode %s %s: %s", name, primitive, exc)
+            return get_value(primitive)
+
+
     def parse_primitives(self, listing):
         '''given a listing of primitives (e.g., a pipelist from _parse_pipe
            or positional arguments from parse_params) return the content
@@ -206,18 +334,33 @@ class PluginBase:
                {"anchor":null,"span":{"start":5,"end":6}},
                "item":{"Primitive":{"Int":1}}}..]
         '''
-        # In case None
-        listing = listing or []
+        return list(self.iter_primitives(listing))
+
 
-        # Return list of values as the pipe content
-        entries = []
+    def iter_primitives(self, listing, primitive_type=None):
+        '''yield the content of each primitive in a listing (see 
+           parse_primitives). The listing can also be a generator.
+
+           Parameters
+           ==========
+           listing: the list of entries, each with a tag and item
+           primitive_type: if defined, only yield primitives of this type
+                           (e.g., Int or String) or a list of types
+        '''
+        if isinstance(primitive_type, str):
+            primitive_type = [primitive_type]
+        if primitive_type is not None:
+            primitive_type = set(primitive_type)
 
         # Each entry has a tag and item. We want the Primitive (type)
-        for entry in listing:
+        for entry in listing or []:
             item = entry['item'].get('Primitive')
-            entries = entries + list(item.values())
-
-        return entries
+            if primitive_type is None:
+                yield from item.values()
+            else:
+                for name, value in item.items():
+                    if name in primitive_type:
+                        yield value
 
 
     def getTag(self):
@@ -252,31 +395,29 @@ class PluginBase:
         if not self._parse_params:
             return input_params
 
-        positional = input_params['args'].get('positional', [])
-        named = input_params['args'].get('named', {})
+        positional = input_params['args'].get('positional') or []
+        named = input_params['args'].get('named') or {}
+        if self._decoders is None:
+            self._decoders = self.get_decoders()
+        named_decoders, positional_decoders = self._decoders
 
         # We will return lookup dictionary of params
         params = {}
 
-        # Keep a simple dictionary with values we know types for
+        # Each value is decoded for the SyntaxShape of the argument
         for name, values in named.items():
-
-            # is it a String? Boolean?
-            value_type = list(values['item']['Primitive'].keys())[0]
-
-            if value_type == "String":
-                params[name] = values['item']['Primitive']['String']
-
-            elif value_type == "Boolean":
-                params[name] = values['item']['Primitive']['Boolean']
-
-            # If you use other types, add them here
-            else:
-                self.logger.info("Invalid paramater type %s:%s" %(name, values))
-
-        # Add positional arguments
-        params["_positional"] = self.parse_primitives(positional)
-        return params        
+            primitive = values['item'].get('Primitive')
+            if primitive is None:
+                self.logger.info("Invalid paramater type %s:%s", name, values)
+                continue
+            params[name] = self.decode(named_decoders.get(name, get_value), name, primitive)
+
+        # Add positional arguments, extra arguments are returned as they are
+        params["_positional"] = [
+            self.decode(positional_decoders[index] if index < len(positional_decoders)
+                        else get_value, index, entry['item']['Primitive'])
+            for index, entry in enumerate(positional)]
+        return params
 
 
     def get_help(self):
@@ -0,0 +1,129 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import functools
+import os
+import random
+
+# Profile cpu (cProfile) or memory (tracemalloc)
+PROFILES = ["cpu", "mem"]
+
+# Number of frames tracemalloc keeps for each allocation
+TRACE_FRAMES = 1
+
+
+class Profiler:
+
+    def __init__(self, mode, prefix, frames=TRACE_FRAMES):
+        '''a Profiler profiles the cpu (with cProfile) or memory (with
+           tracemalloc) while a plugin runs, and then writes <prefix>.pstats
+           (open with pstats or snakeviz) or <prefix>.snapshot (load with
+           tracemalloc.Snapshot.load).
+
+           Parameters
+           ==========
+           mode: cpu or mem
+           prefix: the path for the output file, without the extension
+           frames: the number of frames tracemalloc keeps per allocation
+        '''
+        if mode not in PROFILES:
+            raise ValueError("%s is not a valid profile, choices are %s"
+                             % (mode, ", ".join(PROFILES)))
+        self.mode = mode
+        self.prefix = prefix
+        self.frames = frames
+        self.profile = None
+        self.path = None
+
+
+    def start(self):
+        if self.mode == "cpu":
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            import tracemalloc
+            tracemalloc.start(self.frames)
+
+
+    def stop(self):
+        '''stop profiling, and write the output file. We return the path.
+        '''
+        if self.mode == "cpu":
+            self.profile.disable()
+            self.path = "%s.pstats" % self.prefix
+            self.profile.dump_stats(self.path)
+        else:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.path = "%s.snapshot" % self.prefix
+            snapshot.dump(self.path)
+        return self.path
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def get_profiler(logfile, mode=None, sample=None, frames=None):
+    '''return a Profiler if the environment variable NU_PLUGIN_PROFILE is
+       cpu or mem, or None if it isn't set or this run isn't sampled. The
+       output is written next to the logfile, with the process id.
+
+       Parameters
+       ==========
+       logfile: the plugin logfile, e.g., /tmp/nu_plugin_<name>.log
+       mode: cpu or mem, defaults to NU_PLUGIN_PROFILE
+       sample: the fraction of runs to profile (0 to 1) defaults to
+               NU_PLUGIN_PROFILE_SAMPLE, or 1 (every run)
+       frames: for mem, frames to keep per allocation, defaults to
+               NU_PLUGIN_PROFILE_FRAMES, or 1 (the lowest overhead)
+    '''
+    mode = mode or os.environ.get("NU_PLUGIN_PROFILE")
+    if not mode:
+        return None
+
+    if sample is None:
+        sample = float(os.environ.get("NU_PLUGIN_PROFILE_SAMPLE", 1))
+    if random.random() >= sample:
+        return None
+
+    frames = frames or int(os.environ.get("NU_PLUGIN_PROFILE_FRAMES", TRACE_FRAMES))
+    prefix = "%s.%s" % (os.path.splitext(logfile)[0], os.getpid())
+    return Profiler(mode.lower(), prefix, frames)
+
+
+def profiled(run):
+    '''a decorator for the run functions of a plugin, to profile the run
+       if NU_PLUGIN_PROFILE is set. A run called from another (e.g., run
+       calls run_async) is part of the same profile.
+    '''
+    @functools.wraps(run)
+    def profiled_run(plugin, *args, **kwargs):
+        if getattr(plugin, "_profiler", None) is not None:
+            return run(plugin, *args, **kwargs)
+
+        profiler = get_profiler(plugin.logger.logfile)
+        if profiler is None:
+            return run(plugin, *args, **kwargs)
+
+        plugin._profiler = profiler
+        try:
+            with profiler:
+                return run(plugin, *args, **kwargs)
+        finally:
+            plugin._profiler = None
+            plugin.logger.info("Wrote %s profile to %s", profiler.mode, profiler.path)
+            plugin.logger.flush()
+
+    return profiled_run
@@ -0,0 +1,113 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.writer import input_ready
+
+import sys
+import threading
+
+# Read up to this many bytes from stdin at once
+READ_SIZE = 1048576
+
+
+class RequestReader:
+
+    def __init__(self, stream=None, size=READ_SIZE):
+        '''a RequestReader yields raw lines (bytes, without the newline) from
+           the binary stdin, reading whatever is available up to size bytes
+           at once. We never wait for a full buffer, so a request is handed
+           over as soon as its line is complete.
+
+           Parameters
+           ==========
+           stream: a binary stream to read, defaults to sys.stdin.buffer
+           size: the maximum number of bytes to read at once
+        '''
+        if stream is None:
+            stream = sys.stdin.buffer
+        self.stream = stream
+        self.size = size
+        self.pending = 0
+        self._read = getattr(stream, "read1", stream.read)
+
+
+    def ready(self, timeout=0):
+        '''return True if a complete line can be returned without blocking,
+           optionally waiting up to timeout seconds for input
+        '''
+        return self.pending > 0 or input_ready(self.stream, timeout)
+
+
+    def chunks(self):
+        '''yield whatever bytes are available, until the end of input. This
+           is for binary messages that aren't separated by newlines.
+        '''
+        while True:
+            chunk = self._read(self.size)
+            if not chunk:
+                return
+            yield chunk
+
+
+    def __iter__(self):
+        '''yield each non-empty line. A line that spans several reads is
+           collected in parts, and only joined once it is complete.
+        '''
+        parts = []
+        while True:
+            chunk = self._read(self.size)
+
+            # End of input, the last line might not have a newline
+            if not chunk:
+                if parts:
+                    yield b"".join(parts)
+                return
+
+            if b"\n" not in chunk:
+                parts.append(chunk)
+                continue
+
+            lines = chunk.split(b"\n")
+            if parts:
+                parts.append(lines[0])
+                lines[0] = b"".join(parts)
+
+            # The last entry is the start of the next line (or empty)
+            last = lines.pop()
+            parts = [last] if last else []
+
+            # Only lines we will yield are pending, empty lines are skipped
+            lines = [line for line in lines if line]
+            self.pending = len(lines)
+            for line in lines:
+                self.pending -= 1
+                yield line
+
+
+    def queue(self, lines=None):
+        '''for asyncio, start a thread to read lines and put them on an
+           asyncio.Queue (with None at the end of input). This must be
+           called from a coroutine, so we put lines on the running loop.
+           To continue from lines we started to read, give the iterator.
+        '''
+        import asyncio
+        loop = asyncio.get_event_loop()
+        source = self if lines is None else lines
+        lines = asyncio.Queue()
+
+        def feed():
+            try:
+                for line in source:
+                    loop.call_soon_threadsafe(lines.put_nowait, line)
+                loop.call_soon_threadsafe(lines.put_nowait, None)
+
+            # The loop is closed when the plugin is done before input ends
+            except RuntimeError:
+                pass
+
+        threading.Thread(target=feed, daemon=True).start()
+        return lines
@@ -0,0 +1,137 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Nushell starts every nu_plugin_* on the path to ask for its config, so a
+# plugin can save its config (with --signature) to a signature file, and
+# answer config from that file before importing anything else. This module
+# should only import from the standard library to keep that fast.
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+# Run the plugin with this switch to save the signature file
+SIGNATURE_SWITCH = "--signature"
+
+# Read up to this many bytes to look for a config request
+PEEK_SIZE = 65536
+
+
+def get_signature_file(script=None):
+    '''return the path to the signature file for a script, from the
+       environment variable NU_PLUGIN_SIGNATURE, or next to the logfile
+       in the temporary directory as <script>.signature
+    '''
+    path = os.environ.get("NU_PLUGIN_SIGNATURE")
+    if path:
+        return path
+    script = script or sys.argv[0]
+    return os.path.join(tempfile.gettempdir(), "%s.signature" % os.path.basename(script))
+
+
+def get_script_hash(script):
+    '''return the sha256 of the content of a script
+    '''
+    digest = hashlib.sha256()
+    with open(script, 'rb') as filey:
+        digest.update(filey.read())
+    return digest.hexdigest()
+
+
+def is_signature(argv=None):
+    '''the user runs the plugin with --signature to save the signature file
+    '''
+    return SIGNATURE_SWITCH in (sys.argv if argv is None else argv)
+
+
+def write_signature(config, script=None, path=None):
+    '''save a plugin config to the signature file, with the mtime and hash
+       of the script so we can tell when it changes.
+
+       Parameters
+       ==========
+       config: the result of plugin.get_config()
+       script: the plugin script, defaults to sys.argv[0]
+       path: the signature file, defaults to get_signature_file(script)
+    '''
+    script = os.path.abspath(script or sys.argv[0])
+    path = path or get_signature_file(script)
+    stat = os.stat(script)
+    signature = {"script": script,
+                 "mtime": stat.st_mtime,
+                 "size": stat.st_size,
+                 "sha256": get_script_hash(script),
+                 "config": config}
+
+    # Write to a temporary file first, a running plugin might be reading it
+    tmpfile = "%s.%s" % (path, os.getpid())
+    with open(tmpfile, 'w', encoding='utf-8') as filey:
+        filey.write(json.dumps(signature))
+    os.replace(tmpfile, path)
+    return path
+
+
+def read_signature(script=None, path=None):
+    '''return the config from the signature file, or None if there isn't
+       one, or the script has changed since it was written. If only the
+       mtime changed (e.g., the script was copied) we check the hash.
+    '''
+    script = os.path.abspath(script or sys.argv[0])
+    path = path or get_signature_file(script)
+    try:
+        with open(path, 'r', encoding='utf-8') as filey:
+            signature = json.loads(filey.read())
+        stat = os.stat(script)
+    except (OSError, ValueError):
+        return None
+
+    if signature.get("script") != script or signature.get("size") != stat.st_size:
+        return None
+    if signature.get("mtime") != stat.st_mtime and \
+       signature.get("sha256") != get_script_hash(script):
+        return None
+    return signature.get("config")
+
+
+def answer_config(script=None, path=None):
+    '''if the first request on stdin is for the config, and the signature
+       file is current, print the config response and exit. Otherwise we
+       return without consuming any input, and the plugin runs as usual.
+       Call this at the top of a plugin script, before other imports.
+
+       Parameters
+       ==========
+       script: the plugin script, defaults to sys.argv[0]
+       path: the signature file, defaults to get_signature_file(script)
+    '''
+    if len(sys.argv) > 1:
+        return
+
+    # We can only look at input without consuming it from a buffered stream
+    stream = getattr(sys.stdin, "buffer", None)
+    if stream is None or not hasattr(stream, "peek"):
+        return
+
+    try:
+        data = stream.peek(PEEK_SIZE)
+        request = json.loads(data.split(b"\n", 1)[0].decode('utf-8'))
+    except (OSError, ValueError):
+        return
+
+    if not isinstance(request, dict) or request.get("method") != "config":
+        return
+
+    config = read_signature(script, path)
+    if config is None:
+        return
+
+    response = {"jsonrpc": "2.0", "method": "response", "params": {"Ok": config}}
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+    sys.exit(0)
@@ -6,10 +6,16 @@
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+from nushell.lazy import get_function, is_coroutine_function
+from nushell.persistent import PersistentServer, is_persistent
 from nushell.plugin import PluginBase
+from nushell.profiler import profiled
+from nushell.reader import RequestReader
+from nushell.signature import is_signature
+from nushell.stream import StreamDecoder
 
-import fileinput
-import json
+import functools
+import time
 
 
 class SinkPlugin(PluginBase):
@@ -20,6 +26,7 @@ class SinkPlugin(PluginBase):
     '''
     is_filter = False
     parse_pipe = True
+    stream_pipe = False
 
     def get_sink_params(self, input_params):
         '''The input params (under ["params"] is a list, with the first entry
@@ -41,12 +48,11 @@ class SinkPlugin(PluginBase):
         if not input_params:
             return input_params 
 
-        # Args are always the first entry
-        args = input_params.pop(0)
-        params = self.parse_params(args)
+        # Args are always the first entry (we don't change the request)
+        params = self.parse_params(input_params[0])
 
         # The pipe entries are the rest (pass as _pipe)
-        params["_pipe"] = self._parse_pipe(input_params)
+        params["_pipe"] = self._parse_pipe(input_params[1:])
         return params
 
 
@@ -63,7 +69,12 @@ class SinkPlugin(PluginBase):
         if not pipeList or not self.parse_pipe:
             return pipeList
 
-        pipeList = pipeList.pop(0)
+        pipeList = pipeList[0]
+
+        # A streamed pipe is a generator, and we return values lazily
+        if self.stream_pipe:
+            return self.iter_primitives(pipeList)
+
         return self.parse_primitives(pipeList)
 
 
@@ -91,26 +102,78 @@ class SinkPlugin(PluginBase):
                 return self.get_help()
 
             # Run the sink, and provide the user with plugin and params
-            return sinkFunc(self, params)
+            return self._run_sink(sinkFunc, params)
 
 
-    def run(self, sinkFunc):
-        '''the main run function is required to take a user sinkFunc.
+    def _run_sink(self, sinkFunc, params):
+        '''call the user sinkFunc, which can also be an async function
         '''
-        for line in fileinput.input():
+        if is_coroutine_function(sinkFunc):
+            return self.run_coroutine(sinkFunc(self, params))
+        return sinkFunc(self, params)
 
-            x = json.loads(line)
-            method = x.get("method")
+
+    def _finish(self, method, dispatched):
+        '''record the time since a method was dispatched
+        '''
+        finished = time.perf_counter()
+        self.metrics.method(method, finished - dispatched)
+        if self.tracer is not None:
+            self.tracer.span(method, dispatched, finished)
+
+
+    def get_requests(self):
+        '''yield requests from stdin. If stream_pipe is set, there is only
+           one request and the pipe entries are decoded as they are used.
+        '''
+        self.reader = RequestReader()
+        if self.stream_pipe:
+            yield StreamDecoder(self.reader.stream).request()
+            return
+
+        start = time.perf_counter()
+        for line in self.reader:
 
             # Keep log of requests from nu
-            self.logger.info("REQUEST %s" % line)
-            self.logger.info("METHOD %s" % method)
+            self.logger.info("REQUEST %s", line.decode)
+            decoded = time.perf_counter()
+            x = self.codec.loads(line)
+            self.metrics.record("read", decoded - start, len(line))
+            self.metrics.record("decode", time.perf_counter() - decoded)
+            if self.tracer is not None:
+                self.tracer.span("read", start, decoded, {"bytes": len(line)})
+            yield x
+            start = time.perf_counter()
+
+
+    @profiled
+    def run(self, sinkFunc):
+        '''the main run function is required to take a user sinkFunc. If
+           nushell started the plugin with --stdio, we use the persistent
+           protocol. With --signature, we save the signature file. sinkFunc
+           can also be a "module:function" string, imported when it's first
+           called.
+        '''
+        if is_signature():
+            return self.export_signature()
+
+        sinkFunc = get_function(sinkFunc)
+        if is_persistent():
+            return PersistentServer(self, sinkFunc).run()
+
+        for x in self.get_requests():
+
+            method = x.get("method")
+            self.logger.info("METHOD %s", method)
+            dispatched = time.perf_counter()
 
             # Case 1: Nu is asking for the config to discover the plugin
             if method == "config":
                 plugin_config = self.get_config()
-                self.logger.info("plugin-config: %s" % json.dumps(plugin_config))
+                self.logger.info("plugin-config: %s", functools.partial(self.codec.dumps,
+                                                                        plugin_config))
                 self.print_good_response(plugin_config)
+                self._finish(method, dispatched)
                 break
 
             # Case 2: A sink passes execution to the sink function
@@ -118,7 +181,7 @@ class SinkPlugin(PluginBase):
 
                 # Parse parameters for the calling sink, _pipe included
                 params = self.get_sink_params(x['params'])
-                self.logger.info("PARAMS %s" % params)
+                self.logger.info("PARAMS %s", params)
 
                 # The only case of not running is if the user asks for help
                 if params.get('help', False):
@@ -126,5 +189,14 @@ class SinkPlugin(PluginBase):
 
                 # Run the sink, and provide the user with plugin and params
                 else:
-                    sinkFunc(self, params)
+                    self._run_sink(sinkFunc, params)
+                self._finish(method, dispatched)
                 break
+
+        # Ensure that responses and queued log messages are written
+        self.writer.flush()
+        if self.metrics.methods["sink"].count:
+            self.metrics.dump(self.logger)
+        self.logger.flush()
+        if self.tracer is not None:
+            self.tracer.write()
@@ -0,0 +1,151 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import codecs
+import json
+
+# Read up to this many bytes from the stream at once
+READ_SIZE = 65536
+WHITESPACE = " \t\r\n"
+
+
+class StreamDecoder:
+
+    def __init__(self, stream, size=READ_SIZE):
+        '''a StreamDecoder parses one json request from a binary stream, a
+           piece at a time. It's used for sink requests, where the params
+           are a list with the args and then the (potentially very large)
+           list of piped entries. The entries are decoded one at a time
+           as they are asked for, so we never hold the whole request.
+
+           Parameters
+           ==========
+           stream: a binary stream, usually sys.stdin.buffer
+           size: the maximum number of bytes to read at once
+        '''
+        self.stream = stream
+        self.size = size
+        self._read = getattr(stream, "read1", stream.read)
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+
+    def request(self):
+        '''parse the start of the request, and return it as a dictionary.
+           If the request has params, they are a list with the args and
+           a generator for the piped entries. Any keys that come after
+           params are not parsed.
+        '''
+        request = {}
+        self.expect("{")
+        while self.peek() != "}":
+            key = self.value()
+            self.expect(":")
+
+            if key == "params":
+                request["params"] = self.params()
+                return request
+
+            request[key] = self.value()
+            if self.peek() == ",":
+                self.expect(",")
+        return request
+
+
+    def params(self):
+        '''parse the params list, and return the first entry (the args)
+           and a generator to decode the second (the pipe) lazily.
+        '''
+        self.expect("[")
+        if self.peek() == "]":
+            return []
+
+        args = self.value()
+        if self.peek() == "]":
+            return [args]
+
+        self.expect(",")
+        return [args, self.entries()]
+
+
+    def entries(self):
+        '''yield each entry of a list, decoding one at a time
+        '''
+        self.expect("[")
+        if self.peek() == "]":
+            self.expect("]")
+            return
+
+        while True:
+            yield self.value()
+            if self.peek() == "]":
+                self.expect("]")
+                return
+            self.expect(",")
+
+
+# Parsing
+
+    def fill(self):
+        '''read more from the stream into the buffer, dropping what we have
+           already parsed. Returns False at the end of the stream.
+        '''
+        if self.eof:
+            return False
+
+        chunk = self._read(self.size)
+        if not chunk:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self.utf8.decode(b"", final=True)
+            self.pos = 0
+            return False
+
+        self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk)
+        self.pos = 0
+        return True
+
+
+    def peek(self):
+        '''skip whitespace and return the next character
+        '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of request")
+
+
+    def expect(self, character):
+        '''consume the next (non whitespace) character, which must match
+        '''
+        found = self.peek()
+        if found != character:
+            raise ValueError("Expected %s but found %s at %s" %
+                             (character, found, self.pos))
+        self.pos += 1
+
+
+    def value(self):
+        '''decode the next complete json value. If it's incomplete, or if it
+           ends with the buffer (e.g., a number could continue) we read more.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
@@ -6,6 +6,18 @@
 # Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+from .plugin_requests import (
+    filter_begin_request,
+    filter_end_request,
+    filter_string_request
+)
+
+import copy
+import io
+import json
+import sys
+
+
 def assert_good_response(response):
     '''ensure that a response is good, meaning jsonrpc 2.0 and method response
     '''
@@ -63,3 +75,36 @@ def check_remove_help(plugin, plugin_name, usage, is_filter):
     plugin.add_positional_argument("avatar", "Optional", "String")
     assert "avatar" in plugin._positional
     assert plugin.positional # len > 0
+
+
+def run_plugin(plugin, runFunc, requests, monkeypatch, method="run", **kwargs):
+    '''run a plugin with a list of requests as stdin, and return the list
+       of parsed responses written to stdout
+    '''
+    lines = "".join(json.dumps(request) + "\n" for request in requests)
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(lines.encode('utf-8'))))
+    plugin.writer.stream = io.BytesIO()
+    getattr(plugin, method)(runFunc, **kwargs)
+    output = plugin.writer.stream.getvalue().decode('utf-8')
+    return [json.loads(line) for line in output.splitlines()]
+
+
+def get_filter_requests(values):
+    '''return begin_filter (without --help), a filter request for each
+       value, and end_filter
+    '''
+    begin = copy.deepcopy(filter_begin_request)
+    begin['params']['args']['named'] = {}
+    requests = [begin]
+    for value in values:
+        request = copy.deepcopy(filter_string_request)
+        request['params']['item']['Primitive'] = {"String": value}
+        requests.append(request)
+    return requests + [filter_end_request]
+
+
+def get_response_values(responses):
+    '''return the primitive value for each filter response
+    '''
+    return [response['params']['Ok'][0]['Ok']['Value']['item']['Primitive']
+            for response in responses[1:-1]]
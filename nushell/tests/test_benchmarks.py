@@ -0,0 +1,226 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Micro-benchmarks for hot paths, run with pytest -s to see the timings
+
+from nushell.codec import JsonCodec, get_encoding
+from nushell.filter import FilterPlugin
+from nushell.reader import RequestReader
+from .helpers import run_plugin
+from .plugin_requests import (
+    filter_begin_request,
+    filter_end_request,
+    filter_string_request,
+    filter_int_request
+)
+
+import copy
+import hashlib
+import fileinput
+import json
+import os
+import time
+import timeit
+import pytest
+
+
+def deepcopy_response(plugin, value, primitive_type):
+    '''the previous print_primitive_response, deep copying the params
+    '''
+    response = copy.deepcopy(plugin.params)
+    response["item"] = {"Primitive": {primitive_type: value}}
+    return [{"Ok": {"Value": response}}]
+
+
+def len_filter(plugin, params):
+    '''the examples/len runFilter, returning the response
+    '''
+    value = plugin.get_string_primitive()
+    return plugin.print_primitive_response(len(value), "Int", True)
+
+
+def plus_filter(plugin, params):
+    '''the examples/plus runFilter, returning the response
+    '''
+    total = int(plugin.get_primitive()) + 1
+    return plugin.print_primitive_response(str(total), "String", True)
+
+
+def per_item(func, number=20000):
+    '''return the best per-item cost (microseconds) of calling func
+    '''
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    return best / number * 1e6
+
+
+@pytest.mark.parametrize("name,request_,item,runFilter,value,primitive_type", [
+    ("len", filter_string_request, {"String": "pancakes"}, len_filter, 8, "Int"),
+    ("plus", filter_int_request, {"Int": 1}, plus_filter, "2", "String"),
+])
+def test_benchmark_primitive_response(name, request_, item, runFilter, value,
+                                      primitive_type):
+    '''compare per-item cost of the deepcopy response against the current
+    '''
+    plugin = FilterPlugin(name=name, usage="benchmark", logging=False)
+    request_ = copy.deepcopy(request_)
+    request_["params"]["item"]["Primitive"] = item
+    plugin.params = request_["params"]
+
+    # Both paths must produce the same response
+    expected = deepcopy_response(plugin, value, primitive_type)
+    assert runFilter(plugin, {}) == expected
+
+    before = per_item(lambda: deepcopy_response(plugin, value, primitive_type))
+    after = per_item(lambda: runFilter(plugin, {}))
+    print("\n%s: deepcopy %.2fus/item, current %.2fus/item" % (name, before, after))
+    assert after < before
+
+
+def lines_per_second(func, count, repeat=3):
+    '''return the best rate of a function that returns the number of lines
+       read, out of repeat runs
+    '''
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert func() == count
+        seconds.append(time.perf_counter() - start)
+    return count / min(seconds)
+
+
+def test_benchmark_reader(tmp_path):
+    '''compare lines/sec of fileinput against the RequestReader, reading
+       and then decoding a synthetic stream of filter requests. The number
+       of lines can be set with NU_PLUGIN_BENCHMARK_LINES (e.g., 1000000
+       for a stable comparison, the default keeps the tests quick)
+    '''
+    count = int(os.environ.get("NU_PLUGIN_BENCHMARK_LINES", 20000))
+    stream = os.path.join(str(tmp_path), "filter_stream.jsonl")
+    line = json.dumps(filter_string_request) + "\n"
+    with open(stream, 'w') as filey:
+        filey.write(line * count)
+
+    codec = JsonCodec()
+
+    def read_fileinput(decode=None):
+        with fileinput.input(files=[stream]) as lines:
+            return sum(1 for line in lines if not decode or decode(line))
+
+    def read_reader(decode=None):
+        with open(stream, 'rb') as filey:
+            return sum(1 for line in RequestReader(filey)
+                       if not decode or decode(line))
+
+    rates = {}
+    for label, before, after in [
+            ("read", lambda: read_fileinput(), lambda: read_reader()),
+            ("read+decode", lambda: read_fileinput(json.loads),
+             lambda: read_reader(codec.loads))]:
+        before = lines_per_second(before, count)
+        after = lines_per_second(after, count)
+        print("\n%s: fileinput %d lines/sec, RequestReader %d lines/sec"
+              % (label, before, after))
+        rates[label] = (before, after)
+
+    # Decoding takes most of the time for both, so we compare just reading
+    before, after = rates["read"]
+    assert after >= before
+
+
+def hash_value(params, value):
+    '''a CPU heavy function for run_parallel, hash the value many times
+    '''
+    digest = value.encode('utf-8')
+    for _ in range(2000):
+        digest = hashlib.sha256(digest).digest()
+    return digest.hex()
+
+
+def test_benchmark_parallel(monkeypatch):
+    '''compare items/sec of run_parallel for an increasing number of workers
+    '''
+    begin = copy.deepcopy(filter_begin_request)
+    begin['params']['args']['named'] = {}
+    requests = [begin]
+    for i in range(400):
+        request = copy.deepcopy(filter_string_request)
+        request['params']['item']['Primitive'] = {"String": str(i)}
+        requests.append(request)
+    requests.append(filter_end_request)
+    expected = [hash_value({}, str(i)) for i in range(400)]
+
+    for workers in [1, 2, 4]:
+        plugin = FilterPlugin(name="parallel", usage="benchmark", logging=False)
+        start = time.perf_counter()
+        responses = run_plugin(plugin, hash_value, requests, monkeypatch,
+                               method="run_parallel", workers=workers)
+        rate = 400 / (time.perf_counter() - start)
+        print("\nparallel: %d workers %d items/sec" % (workers, rate))
+        values = [response['params']['Ok'][0]['Ok']['Value']['item']['Primitive']['String']
+                  for response in responses[1:-1]]
+        assert values == expected
+
+
+def concatenate_primitives(listing):
+    '''the previous parse_primitives, concatenating a new list per entry
+    '''
+    entries = []
+    for entry in listing:
+        item = entry['item'].get('Primitive')
+        entries = entries + list(item.values())
+    return entries
+
+
+def test_benchmark_primitives():
+    '''parse_primitives must scale linearly with the number of entries
+    '''
+    plugin = FilterPlugin(name="primitives", usage="benchmark", logging=False)
+    entry = {"tag": {"anchor": None, "span": {"start": 0, "end": 2}},
+             "item": {"Primitive": {"Int": 1}}}
+
+    rates = {}
+    for count in [1000, 100000, 1000000]:
+        listing = [entry] * count
+        seconds = min(timeit.repeat(lambda: plugin.parse_primitives(listing),
+                                    number=1, repeat=3))
+        rates[count] = seconds / count * 1e9
+        print("\nprimitives: %d entries %.1fns/entry" % (count, rates[count]))
+
+        # The previous implementation is quadratic, only time it when small
+        if count <= 1000:
+            seconds = min(timeit.repeat(lambda: concatenate_primitives(listing),
+                                        number=1, repeat=3))
+            print("primitives: %d entries %.1fns/entry (concatenated)"
+                  % (count, seconds / count * 1e9))
+
+    # Linear, so the cost per entry doesn't grow with the number of entries
+    assert rates[1000000] < rates[1000] * 10
+
+
+def test_benchmark_encodings():
+    '''compare bytes on the wire and rows/sec to encode and decode a table
+       (a persistent protocol List of Records) for each installed encoding
+    '''
+    span = {"start": 0, "end": 8}
+    rows = [{"Record": {"val": {"name": {"String": {"val": "row%s" % i, "span": span}},
+                                "size": {"Int": {"val": i * 1024, "span": span}},
+                                "ratio": {"Float": {"val": i / 3.0, "span": span}}},
+                        "span": span}} for i in range(20000)]
+    table = {"List": {"vals": rows, "span": span}}
+
+    for name in ["json", "msgpack"]:
+        codec = get_encoding(name)
+        if codec.encoding != name:
+            print("\nencoding: %s is not installed" % name)
+            continue
+        data = codec.encode(table)
+        assert codec.loads(data) == table
+        encode = min(timeit.repeat(lambda: codec.encode(table), number=1, repeat=3))
+        decode = min(timeit.repeat(lambda: codec.loads(data), number=1, repeat=3))
+        print("\nencoding: %s %d bytes, encode %d rows/sec, decode %d rows/sec"
+              % (name, len(data), len(rows) / encode, len(rows) / decode))
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.cache import DiskCache, MemoryCache, MISSING
+from nushell.filter import FilterPlugin
+from nushell.sink import SinkPlugin
+from .helpers import (
+    get_filter_requests,
+    get_response_values,
+    run_plugin
+)
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+import time
+import pytest
+
+
+def test_memory_cache():
+    '''a MemoryCache removes the least recently used result
+    '''
+    cache = MemoryCache(size=2)
+    cache.set("a", 1)
+    cache.set("b", None)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    cache.set("c", 3)
+    assert cache.get("a") is MISSING
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 2)
+
+
+def test_disk_cache(tmp_path):
+    '''a DiskCache ignores results that are expired, or another version
+    '''
+    path = os.path.join(str(tmp_path), "results.cache")
+    cache = DiskCache(path, version="1", ttl=60)
+    cache.set(["String", "a"], [{"Ok": 1}])
+    assert cache.get(["String", "a"]) == [{"Ok": 1}]
+    assert cache.get(["String", "b"]) is MISSING
+    cache.close()
+
+    # A new version doesn't see the results
+    assert DiskCache(path, version="2").get(["String", "a"]) is MISSING
+
+    # And results older than the ttl are ignored
+    cache = DiskCache(path, version="1", ttl=60)
+    cache.db.execute("UPDATE results SET created = ?", (time.time() - 120,))
+    assert cache.get(["String", "a"]) is MISSING
+
+    # Eviction removes expired and old results, keeping size
+    cache = DiskCache(path, version="1", size=3)
+    for i in range(10):
+        cache.set(i, i)
+    cache.close()
+    cache = DiskCache(path, version="1")
+    assert len(cache) == 3
+    assert cache.get(9) == 9 and cache.get(6) is MISSING
+
+
+def write_results(path, start):
+    '''write results to a shared cache from another process
+    '''
+    cache = DiskCache(path, version="1")
+    for i in range(start, start + 200):
+        cache.set(i, i * 2)
+    cache.close()
+    return True
+
+
+def test_disk_cache_processes(tmp_path):
+    '''several processes can use the same DiskCache at once
+    '''
+    path = os.path.join(str(tmp_path), "shared.cache")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        assert all(executor.map(write_results, [path] * 4, [0, 200, 400, 600]))
+    cache = DiskCache(path, version="1")
+    assert len(cache) == 800
+    assert cache.get(799) == 1598
+
+
+def test_memoize_disk(tmp_path, monkeypatch):
+    '''responses remembered on disk are used by the next run of a plugin,
+       but not if the plugin configuration changes
+    '''
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    calls = []
+    def runFilter(plugin, params):
+        calls.append(plugin.get_string_primitive())
+        plugin.print_int_response(len(plugin.get_string_primitive()))
+
+    values = ["a", "bb", "a"]
+    for run, expected in enumerate([["a", "bb"], [], ["a", "bb"]]):
+        plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+        if run == 2:
+            plugin.add_named_argument("new", "Switch")
+        plugin.memoize(disk=True, ttl=60)
+        calls[:] = []
+        responses = run_plugin(plugin, runFilter, get_filter_requests(values), monkeypatch)
+        assert get_response_values(responses) == [{"Int": len(v)} for v in values]
+        assert calls == expected
+
+    # A sink can use the same cache directly
+    plugin = SinkPlugin(name="sink", usage="sink", logging=False)
+    cache = plugin.get_cache(ttl=60)
+    cache.set("key", {"value": 1})
+    assert plugin.get_cache().get("key") == {"value": 1}
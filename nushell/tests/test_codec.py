@@ -0,0 +1,127 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.codec import get_codec, get_encoding, lookup, JsonCodec, ResponseTemplate
+from nushell.filter import FilterPlugin
+from . import plugin_requests
+
+import json
+import pytest
+
+
+def get_requests():
+    '''return all request fixtures defined in plugin_requests
+    '''
+    return [value for name, value in vars(plugin_requests).items()
+            if name.endswith("_request")]
+
+
+@pytest.mark.parametrize("name", list(lookup))
+def test_codec_requests(name):
+    '''every installed codec must decode and encode the fixtures the same
+    '''
+    codec = get_codec(name)
+    for request in get_requests():
+        line = json.dumps(request)
+        assert codec.loads(line) == request
+        assert codec.loads(line.encode('utf-8')) == request
+        assert json.loads(codec.dumps(request)) == request
+
+    # Values that some libraries don't handle natively
+    for value in [2**70, {1: "a"}, "unicodé ☃", -0.5]:
+        assert json.loads(codec.dumps(value)) == json.loads(json.dumps(value))
+
+    # Integers larger than 64 bits must not be decoded as floats
+    for value in [2**70, -2**70, 2**64, [1, 2**70], {"Int": 12345678901234567890123}]:
+        line = json.dumps(value)
+        assert codec.loads(line) == value
+        assert codec.loads(line.encode('utf-8')) == value
+        assert repr(codec.loads(line)) == repr(value)
+
+
+def test_codec_selection(monkeypatch):
+    '''codecs can be chosen by argument or environment, and fall back to json
+    '''
+    assert isinstance(get_codec("json"), JsonCodec)
+    assert get_codec("json").name == "json"
+
+    monkeypatch.setenv("NU_PLUGIN_CODEC", "json")
+    assert get_codec().name == "json"
+    plugin = FilterPlugin(name="codec", usage="codec", logging=False)
+    assert plugin.codec.name == "json"
+
+    monkeypatch.delenv("NU_PLUGIN_CODEC")
+    assert get_codec().name in lookup
+
+    with pytest.raises(ValueError):
+        get_codec("notacodec")
+
+
+@pytest.mark.parametrize("name", ["json", "msgpack"])
+def test_encoding_round_trip(name):
+    '''every request fixture must survive a round trip through the wire
+       encoding, one at a time and framed together in a stream
+    '''
+    codec = get_encoding(name)
+    if codec.encoding != name:
+        pytest.skip("%s is not installed" % name)
+
+    requests = get_requests()
+    for request in requests:
+        assert codec.loads(codec.encode(request)) == request
+
+    data = b"".join(codec.frame(request) for request in requests)
+    if codec.binary:
+        unpacker = codec.unpacker()
+        unpacker.feed(data)
+        assert list(unpacker) == requests
+    else:
+        assert [codec.loads(line) for line in data.splitlines()] == requests
+
+
+def test_encoding_selection(monkeypatch):
+    '''the encoding is json unless msgpack is asked for (and installed)
+    '''
+    assert get_encoding().encoding == "json"
+    monkeypatch.setenv("NU_PLUGIN_ENCODING", "msgpack")
+    assert get_encoding().encoding in ["json", "msgpack"]
+    assert get_encoding("json").frame({"a": 1}).endswith(b"\n")
+    with pytest.raises(ValueError):
+        get_encoding("cbor")
+
+
+@pytest.mark.parametrize("name", list(lookup))
+def test_response_template(name):
+    '''primitive responses from a template must be the same bytes as
+       encoding the response, for any tag, value and order of the params
+    '''
+    plugin = FilterPlugin(name="template", usage="template", logging=False)
+    plugin.codec = get_codec(name)
+    written = []
+    plugin.writer.write = written.append
+
+    tags = [{"anchor": None, "span": {"start": 0, "end": 8}},
+            {"anchor": "unicodé \"☃\"", "span": {"start": 12, "end": 2**40}}]
+    values = [(42, "Int"), (-7, "int"), (True, "Int"), ("imanumber", "Int"),
+              ("pancakes", "String"), ("quotes \" and\nlines ☃", "string")]
+    for tag in tags:
+        for params in [{"tag": tag, "item": {"Primitive": {"String": "x"}}},
+                       {"item": {"Primitive": {"Int": 1}}, "tag": tag},
+                       {"tag": tag}]:
+            plugin.params = params
+            for value, primitive_type in values:
+                plugin.print_primitive_response(value, primitive_type)
+                response = plugin.get_primitive_response(value, primitive_type)
+                expected = plugin.codec.encode(plugin.get_good_response(response)) + b"\n"
+                assert written[-1] == expected
+
+    # A template is made once for each type and keys of the params
+    assert len(plugin._templates) == 3 * 4
+
+    with pytest.raises(ValueError):
+        ResponseTemplate(plugin.codec, {"a": 1}, {"a": "missing"})
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Cold start benchmarks: spawn each example plugin, and time how long it
+# takes to answer config, --help, and the first filter (or sink). The
+# fastest time is divided by that of a bare interpreter, so the baselines
+# (in baselines.json) can be compared across machines. The fastest run is
+# much less noisy than the median for a process start. It times process
+# starts, so it only runs when asked to (not on a shared CI runner).
+# Environment:
+#
+#  NU_PLUGIN_BENCHMARK_COLDSTART: if set, run the cold start benchmark
+#  NU_PLUGIN_BENCHMARK_RUNS: the number of runs for each (default 10)
+#  NU_PLUGIN_BENCHMARK_THRESHOLD: fail if the ratio is more than
+#                                 this times the baseline (default 1.5)
+#  NU_PLUGIN_BENCHMARK_SAVE: if set, save the results as the baselines
+
+from .plugin_requests import (
+    config_request,
+    filter_begin_request,
+    filter_end_request,
+    filter_string_request,
+    filter_int_request,
+    sink_help_request,
+    sink_named_request
+)
+
+import copy
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(os.path.dirname(here))
+baselines_file = os.path.join(here, "baselines.json")
+
+RUNS = int(os.environ.get("NU_PLUGIN_BENCHMARK_RUNS", 10))
+THRESHOLD = float(os.environ.get("NU_PLUGIN_BENCHMARK_THRESHOLD", 1.5))
+
+
+def get_filter_requests(request, item):
+    '''return begin_filter (without --help) and a filter request for an item
+    '''
+    begin = copy.deepcopy(filter_begin_request)
+    begin['params']['args']['named'] = {}
+    request = copy.deepcopy(request)
+    request['params']['item']['Primitive'] = item
+    return [begin, request]
+
+
+# Each phase is a list of requests, and if we read one response per request
+# (a filter) or read until the plugin exits (a sink prints and exits)
+phases = {
+    "len": {"config": ([config_request], True),
+            "help": ([filter_begin_request, filter_end_request], True),
+            "first": (get_filter_requests(filter_string_request, {"String": "pancakes"}), True)},
+    "plus": {"config": ([config_request], True),
+             "help": ([filter_begin_request, filter_end_request], True),
+             "first": (get_filter_requests(filter_int_request, {"Int": 1}), True)},
+    "hello": {"config": ([config_request], True),
+              "help": ([sink_help_request], False),
+              "first": ([sink_named_request], False)},
+}
+
+
+def get_env():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get("PYTHONPATH", "")]))
+    env.pop("NU_PLUGIN_SIGNATURE", None)
+    return env
+
+
+def cold_start(command, requests=None, responses=True):
+    '''start a process, send the requests in lock-step, and return the
+       seconds until the last response (or until the process exits, if
+       there are no requests or we don't read responses).
+    '''
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, env=get_env())
+    for request in requests or []:
+        process.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+        process.stdin.flush()
+        if responses:
+            assert process.stdout.readline(), "%s did not respond" % command
+
+    if not requests or not responses:
+        process.stdout.read()
+    elapsed = time.perf_counter() - start
+    process.stdin.close()
+    process.stdout.close()
+    process.wait(timeout=60)
+    return elapsed
+
+
+def get_distribution(times):
+    '''return the min, median, p90 and max of a list of times (ms)
+    '''
+    times = sorted(round(t * 1000, 2) for t in times)
+    return {"min": times[0],
+            "median": round(statistics.median(times), 2),
+            "p90": times[int(0.9 * (len(times) - 1))],
+            "max": times[-1]}
+
+
+@pytest.mark.skipif(not os.environ.get("NU_PLUGIN_BENCHMARK_COLDSTART"),
+                    reason="set NU_PLUGIN_BENCHMARK_COLDSTART to run")
+def test_benchmark_coldstart():
+    '''the cold start latency of each example must not regress
+    '''
+    interpreter = get_distribution([cold_start([sys.executable, "-c", "pass"])
+                                    for _ in range(RUNS)])
+    print("\ninterpreter: min %.1fms median %.1fms"
+          % (interpreter["min"], interpreter["median"]))
+
+    baselines = {}
+    if os.path.exists(baselines_file):
+        with open(baselines_file, 'r') as filey:
+            baselines = json.loads(filey.read())
+
+    results = {}
+    regressions = []
+    for name, plugin_phases in phases.items():
+        script = os.path.join(root, "examples", name, "nu_plugin_%s" % name)
+        for phase, (requests, responses) in plugin_phases.items():
+            times = [cold_start([sys.executable, script], requests, responses)
+                     for _ in range(RUNS)]
+            result = get_distribution(times)
+            result["ratio"] = round(result["min"] / interpreter["min"], 2)
+            key = "%s %s" % (name, phase)
+            results[key] = result
+            print("%s: min %.1fms median %.1fms p90 %.1fms max %.1fms (%.2fx interpreter)"
+                  % (key, result["min"], result["median"], result["p90"],
+                     result["max"], result["ratio"]))
+
+            baseline = baselines.get(key)
+            if baseline and result["ratio"] > baseline["ratio"] * THRESHOLD:
+                regressions.append("%s is %.2fx the interpreter, baseline %.2fx"
+                                   % (key, result["ratio"], baseline["ratio"]))
+
+    if os.environ.get("NU_PLUGIN_BENCHMARK_SAVE"):
+        with open(baselines_file, 'w') as filey:
+            filey.write(json.dumps(results, indent=4, sort_keys=True) + "\n")
+
+    assert not regressions, "\n".join(regressions)
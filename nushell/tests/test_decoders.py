@@ -0,0 +1,105 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.decoders import ColumnPath, get_decoder, get_value
+from nushell.filter import FilterPlugin
+
+import decimal
+import pathlib
+
+
+def get_entry(primitive_type, value):
+    return {"tag": {"anchor": None, "span": {"start": 0, "end": 1}},
+            "item": {"Primitive": {primitive_type: value}}}
+
+
+def get_plugin():
+    plugin = FilterPlugin(name="decoders", usage="test decoders", logging=False)
+    plugin.add_named_argument("count", "Optional", "Int")
+    plugin.add_named_argument("ratio", "Optional", "Number")
+    plugin.add_named_argument("where", "Optional", "Path")
+    plugin.add_named_argument("glob", "Optional", "Pattern")
+    plugin.add_named_argument("column", "Optional", "ColumnPath")
+    plugin.add_named_argument("loud", "Switch")
+    plugin.add_positional_argument("number", "Mandatory", "Int")
+    plugin.add_positional_argument("name", "Optional", "String")
+    return plugin
+
+
+def test_decoders():
+    '''each SyntaxShape has a decoder, and unknown shapes return the value
+    '''
+    assert get_decoder("Int")({"Int": "42"}) == 42
+    assert get_decoder("Number")({"Int": 3}) == 3
+    assert get_decoder("Number")({"Decimal": "1.5"}) == decimal.Decimal("1.5")
+    assert get_decoder("Path")({"Path": "/tmp/a"}) == pathlib.Path("/tmp/a")
+    assert get_decoder("Pattern")({"Pattern": "*.py"}).match("setup.py")
+    assert not get_decoder("Pattern")({"Pattern": "*.py"}).match("setup.cfg")
+    assert get_decoder("String")({"Int": 1}) == "1"
+    assert get_decoder("Nope") is get_value
+
+
+def test_column_path():
+    '''a ColumnPath accepts tagged members (the old protocol) or spanned
+       members (the persistent protocol), and gets a value from a row
+    '''
+    members = [{"tag": {}, "item": {"String": "meta"}},
+               {"tag": {}, "item": {"Int": "1"}}]
+    path = get_decoder("ColumnPath")({"ColumnPath": members})
+    assert path.members == ["meta", 1]
+    assert path({"meta": ["a", "b"]}) == "b"
+
+    spanned = {"members": [{"String": {"val": "meta", "span": {}}},
+                           {"Int": {"val": 1, "span": {}}}]}
+    assert ColumnPath(spanned) == path
+
+
+def test_parse_params():
+    '''params are decoded by the shape the argument was declared with
+    '''
+    plugin = get_plugin()
+    params = {"args": {"positional": [get_entry("Int", "7"),
+                                      get_entry("String", "pancakes"),
+                                      get_entry("Int", 8)],
+                       "named": {"count": get_entry("Int", "3"),
+                                 "ratio": get_entry("Decimal", "0.25"),
+                                 "where": get_entry("Path", "/tmp"),
+                                 "glob": get_entry("Pattern", "nu_*"),
+                                 "loud": get_entry("Boolean", True),
+                                 "other": get_entry("Int", 5)}}}
+    args = plugin.parse_params(params)
+    assert args["count"] == 3
+    assert args["ratio"] == decimal.Decimal("0.25")
+    assert args["where"] == pathlib.Path("/tmp")
+    assert args["glob"].match("nu_plugin")
+    assert args["loud"] is True
+    assert args["other"] == 5
+    assert args["_positional"] == [7, "pancakes", 8]
+
+    # A value that doesn't match the shape is passed as it is
+    params["args"]["named"]["count"] = get_entry("String", "three")
+    assert plugin.parse_params(params)["count"] == "three"
+
+
+def test_decoders_compiled():
+    '''decoders are compiled with the config, and again after arguments
+       are added
+    '''
+    plugin = get_plugin()
+    plugin.get_config()
+    named, positional = plugin._decoders
+    assert named["count"] is get_decoder("Int")
+    assert named["help"] is get_value
+    assert positional == [get_decoder("Int"), get_decoder("String")]
+
+    plugin.add_named_argument("size", "Optional", "Int")
+    assert plugin._decoders is None
+    params = {"args": {"positional": None,
+                       "named": {"size": get_entry("Int", "10")}}}
+    assert plugin.parse_params(params) == {"size": 10, "_positional": []}
+    assert "size" in plugin._decoders[0]
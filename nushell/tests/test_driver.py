@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.driver import PluginDriver, percentile
+
+import os
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(os.path.dirname(here))
+
+
+def get_driver(name):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get("PYTHONPATH", "")]))
+    return PluginDriver(os.path.join(root, "examples", name, "nu_plugin_%s" % name), env=env)
+
+
+@pytest.mark.parametrize("mode,window", [("lockstep", None), ("pipelined", None),
+                                         ("pipelined", 8)])
+def test_driver_filter(mode, window):
+    '''the driver runs a filter pipeline and reports throughput and latency
+    '''
+    driver = get_driver("len")
+    assert driver.config()["name"] == "len"
+
+    report = driver.filter(["pancakes"] * 500, mode=mode, window=window)
+    print("\ndriver: %s %d items/sec p50 %.3fms p99 %.3fms p99.9 %.3fms"
+          % (mode, report["items_per_second"], report["p50"], report["p99"],
+             report["p99.9"]))
+    assert report["items"] == 500
+    assert report["p50"] <= report["p99"] <= report["p99.9"]
+
+    with pytest.raises(ValueError):
+        driver.filter(["pancakes"], mode="sometimes")
+
+
+def test_driver_sink():
+    '''a sink gets the values as one large pipe
+    '''
+    report = get_driver("hello").sink(["pancakes"] * 10000, named={"name": "you",
+                                                                  "excited": True})
+    assert report["output"] == "Hello you!\n"
+    assert report["items"] == 10000
+
+
+def test_percentile():
+    latencies = list(range(1, 1001))
+    assert percentile(latencies, 50) == 500
+    assert percentile(latencies, 99) == 990
+    assert percentile(latencies, 99.9) == 999
+    assert percentile([], 50) is None
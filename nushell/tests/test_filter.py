@@ -10,7 +10,10 @@ from nushell.filter import FilterPlugin
 from .helpers import (
     assert_good_response,
     check_plugin_config,
-    check_remove_help
+    check_remove_help,
+    get_filter_requests,
+    get_response_values,
+    run_plugin
 )
 from .plugin_requests import (
     config_request,
@@ -21,7 +24,11 @@ from .plugin_requests import (
     filter_custom_request
 )
 
+import asyncio
+import copy
 import os
+import sys
+import types
 import pytest
 
 
@@ -93,3 +100,213 @@ def test_filter_config(tmp_path):
     # Test without adding help
     plugin = FilterPlugin(name=plugin_name, usage=usage, logging=False, add_help=False)
     check_remove_help(plugin, plugin_name, usage, is_filter=True)
+
+
+def test_filter_run(monkeypatch):
+    '''run a filter with requests from stdin
+    '''
+    def runFilter(plugin, params):
+        plugin.print_int_response(len(plugin.get_string_primitive()))
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    values = ["a", "bb", "ccc"]
+    responses = run_plugin(plugin, runFilter, get_filter_requests(values), monkeypatch)
+    assert len(responses) == 5
+    for response in responses:
+        assert_good_response(response)
+    assert get_response_values(responses) == [{"Int": 1}, {"Int": 2}, {"Int": 3}]
+    assert responses[-1]['params'] == {'Ok': []}
+
+
+def test_filter_run_batch(monkeypatch):
+    '''run a filter in batch mode, responses must be in order
+    '''
+    batches = []
+    def runBatch(plugin, params, values):
+        batches.append(len(values))
+        return [len(value) if value != "skip" else None for value in values]
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    values = ["x" * i for i in range(1, 11)] + ["skip"]
+    responses = run_plugin(plugin, runBatch, get_filter_requests(values),
+                           monkeypatch, method="run_batch", batch_size=4)
+
+    # All requests are available at once, so batches are full
+    assert batches == [4, 4, 3]
+    assert len(responses) == 13
+    assert get_response_values(responses[:-1]) == [{"Int": i} for i in range(1, 11)]
+    assert responses[-2]['params'] == {'Ok': []}
+    assert responses[-1]['params'] == {'Ok': []}
+
+
+def test_filter_primitive_types(monkeypatch):
+    '''results get the primitive type of their Python type, and a type
+       without one is an error (not a String of its repr)
+    '''
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    for value, primitive_type in [(True, "Boolean"), (2, "Int"), (0.5, "Decimal"),
+                                  ("a", "String"), (None, "Nothing")]:
+        assert plugin.get_primitive_type(value) == primitive_type
+    for value in [b"a", object(), {1, 2}]:
+        with pytest.raises(TypeError):
+            plugin.get_primitive_type(value)
+
+    def runBatch(plugin, params, values):
+        return [len(value) / 2 if value != "none" else [None] for value in values]
+
+    responses = run_plugin(plugin, runBatch, get_filter_requests(["a", "none"]),
+                           monkeypatch, method="run_batch")
+    assert get_response_values(responses[:3]) == [{"Decimal": 0.5}]
+    assert [entry['Ok']['Value']['item'] for entry in responses[2]['params']['Ok']] == \
+        [{"Primitive": {"Nothing": None}}]
+
+    def runBad(plugin, params, values):
+        return [object() for value in values]
+
+    with pytest.raises(TypeError):
+        run_plugin(plugin, runBad, get_filter_requests(["a"]), monkeypatch,
+                   method="run_batch")
+
+
+def length(params, value):
+    '''a function for run_parallel must be defined at the top level
+    '''
+    return len(value)
+
+
+def test_filter_run_parallel(monkeypatch):
+    '''run a filter with a pool of processes, responses must be in order
+    '''
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    values = ["x" * i for i in range(1, 51)]
+    responses = run_plugin(plugin, length, get_filter_requests(values),
+                           monkeypatch, method="run_parallel", workers=2, window=4)
+    assert len(responses) == 52
+    assert get_response_values(responses) == [{"Int": i} for i in range(1, 51)]
+    assert responses[-1]['params'] == {'Ok': []}
+
+
+def test_filter_run_async(monkeypatch):
+    '''run an async filter, slow lookups overlap and stay in order
+    '''
+    running = []
+    concurrency = {"max": 0}
+    async def runFilter(plugin, params, value):
+        running.append(value)
+        concurrency["max"] = max(concurrency["max"], len(running))
+        await asyncio.sleep(0.01 * (len(value) % 3))
+        running.remove(value)
+        return len(value)
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    values = ["x" * i for i in range(1, 21)]
+    responses = run_plugin(plugin, runFilter, get_filter_requests(values),
+                           monkeypatch, method="run_async", concurrency=4)
+    assert len(responses) == 22
+    assert get_response_values(responses) == [{"Int": i} for i in range(1, 21)]
+    assert responses[-1]['params'] == {'Ok': []}
+    assert concurrency["max"] == 4
+
+    # run uses run_async for an async function
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    responses = run_plugin(plugin, runFilter, get_filter_requests(values), monkeypatch)
+    assert get_response_values(responses) == [{"Int": i} for i in range(1, 21)]
+
+    # run_async also takes a "module:function" string
+    monkeypatch.setitem(sys.modules, "async_filters", types.SimpleNamespace(length=runFilter))
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    responses = run_plugin(plugin, "async_filters:length", get_filter_requests(values),
+                           monkeypatch, method="run_async")
+    assert get_response_values(responses) == [{"Int": i} for i in range(1, 21)]
+
+
+def test_filter_memoize(monkeypatch):
+    '''repeated inputs print remembered responses with the current tag
+    '''
+    calls = []
+    def runFilter(plugin, params):
+        value = plugin.get_string_primitive()
+        calls.append(value)
+        if value == "random":
+            plugin.no_cache()
+        plugin.print_int_response(len(value))
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    plugin.memoize(size=2)
+    values = ["a", "bb", "a", "bb", "ccc", "a", "random", "random"]
+    requests = get_filter_requests(values)
+    for i, request in enumerate(requests[1:-1]):
+        request['params']['tag']['span'] = {"start": i, "end": i + 1}
+
+    responses = run_plugin(plugin, runFilter, requests, monkeypatch)
+    assert get_response_values(responses) == [{"Int": len(v)} for v in values]
+
+    # "a" was removed when "ccc" was added (size 2), random is never cached
+    assert calls == ["a", "bb", "ccc", "a", "random", "random"]
+    assert plugin.memo.hits == 2
+
+    # Each response has the tag of its own request
+    for i, response in enumerate(responses[1:-1]):
+        value = response['params']['Ok'][0]['Ok']['Value']
+        assert value['tag']['span'] == {"start": i, "end": i + 1}
+
+
+def test_filter_many_values(monkeypatch):
+    '''a filter can yield (or return) many values, printed as one response
+    '''
+    def words(plugin, params):
+        for word in plugin.get_string_primitive().split():
+            yield word
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    values = ["one", "two words", "", "a b c"]
+    responses = run_plugin(plugin, words, get_filter_requests(values), monkeypatch)
+    assert len(responses) == 6
+    for value, response in zip(values, responses[1:-1]):
+        entries = response['params']['Ok']
+        assert [entry['Ok']['Value']['item'] for entry in entries] == \
+            [{"Primitive": {"String": word}} for word in value.split()]
+        for entry in entries:
+            assert entry['Ok']['Value']['tag'] == filter_string_request['params']['tag']
+
+    # Rows, tables, typed tuples and remembered (memoized) responses
+    calls = []
+    def explode(plugin, params):
+        value = plugin.get_string_primitive()
+        calls.append(value)
+        yield {"name": value, "size": len(value)}
+        yield (len(value), "Int")
+        yield [True]
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    plugin.memoize()
+    responses = run_plugin(plugin, explode, get_filter_requests(["ab", "ab"]), monkeypatch)
+    assert calls == ["ab"]
+    assert responses[1]['params'] == responses[2]['params']
+    row, size, table = [entry['Ok']['Value']['item'] for entry in responses[1]['params']['Ok']]
+    assert row['Row']['entries']['name']['item'] == {"Primitive": {"String": "ab"}}
+    assert row['Row']['entries']['size']['item'] == {"Primitive": {"Int": 2}}
+    assert size == {"Primitive": {"Int": 2}}
+    assert table == {"Table": [dict(filter_string_request['params'],
+                                    item={"Primitive": {"Boolean": True}})]}
+
+    # Testing returns the response for all the values
+    response = plugin.test(explode, filter_string_request)
+    assert_good_response(response)
+    assert len(response['params']['Ok']) == 3
+
+
+def test_filter_return_response(monkeypatch):
+    '''a filter that returns its response (to test) isn't many values
+    '''
+    def runFilter(plugin, params):
+        return plugin.print_primitive_response(len(plugin.get_string_primitive()),
+                                               "Int", True)
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    response = plugin.test(runFilter, filter_string_request)
+    assert response == plugin.get_primitive_response(8, "Int")
+
+    # When run, nothing is printed for the returned response
+    responses = run_plugin(plugin, runFilter, get_filter_requests(["a"]), monkeypatch)
+    assert len(responses) == 2
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.filter import FilterPlugin
+from nushell.lazy import LazyFunction, get_function, is_coroutine_function
+from .helpers import get_filter_requests, get_response_values, run_plugin
+from .plugin_requests import (
+    config_request,
+    sink_help_request,
+    sink_named_request
+)
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(os.path.dirname(here))
+
+script = '''from nushell.sink import SinkPlugin
+
+plugin = SinkPlugin(name="heavy", usage="a sink with heavy imports", logging=False)
+plugin.add_named_argument("sink", "Switch", usage="run the sink")
+plugin.run("heavy_sink:sink")
+'''
+
+# importlib.import_module isn't timed, so we look for what the module imports
+module = '''import heavy_dependency
+
+def sink(plugin, params):
+    print("sunk %s" % params["sink"])
+'''
+
+
+def run_importtime(tmp_path, request):
+    '''run the plugin with -X importtime for a request, and return the
+       output and the names of the modules that were imported
+    '''
+    path = str(tmp_path / "nu_plugin_heavy")
+    with open(path, 'w') as filey:
+        filey.write(script)
+    with open(str(tmp_path / "heavy_sink.py"), 'w') as filey:
+        filey.write(module)
+    with open(str(tmp_path / "heavy_dependency.py"), 'w') as filey:
+        filey.write("import fractions\n")
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, str(tmp_path)]))
+    result = subprocess.run([sys.executable, "-X", "importtime", path],
+                            input=(json.dumps(request) + "\n").encode('utf-8'),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            env=env, check=True, timeout=60)
+    modules = [line.split("|")[-1].strip() for line in
+               result.stderr.decode('utf-8').splitlines() if line.startswith("import time:")]
+    return result.stdout.decode('utf-8'), modules
+
+
+def test_lazy_importtime(tmp_path):
+    '''config and --help are answered without importing the sink module
+    '''
+    output, modules = run_importtime(tmp_path, config_request)
+    assert json.loads(output)["params"]["Ok"]["name"] == "heavy"
+    assert "heavy_dependency" not in modules and "fractions" not in modules
+    for name in ["asyncio", "concurrent.futures", "sqlite3"]:
+        assert name not in modules
+
+    output, modules = run_importtime(tmp_path, sink_help_request)
+    assert "heavy: a sink with heavy imports" in output
+    assert "heavy_dependency" not in modules
+
+    output, modules = run_importtime(tmp_path, sink_named_request)
+    assert output == "sunk True\n"
+    assert "heavy_dependency" in modules and "fractions" in modules
+
+
+def test_lazy_function():
+    '''a LazyFunction loads once, runs coroutines, and can be pickled
+    '''
+    loads = []
+
+    def load():
+        loads.append(1)
+
+        async def double(value):
+            return value * 2
+        return double
+
+    func = LazyFunction(load)
+    assert loads == []
+    assert func(2) == 4 and func(3) == 6
+    assert loads == [1]
+
+    func = get_function("os.path:join")
+    assert isinstance(func, LazyFunction)
+    assert func("a", "b") == os.path.join("a", "b")
+    assert pickle.loads(pickle.dumps(func))("c", "d") == os.path.join("c", "d")
+    assert get_function(os.path.join) is os.path.join
+
+    with pytest.raises(ValueError):
+        LazyFunction("os.path.join")
+
+
+def test_is_coroutine_function():
+    '''coroutine functions and methods are found without asyncio
+    '''
+    class Runner:
+        async def run(self):
+            pass
+
+        def sync(self):
+            pass
+
+    async def run():
+        pass
+
+    assert is_coroutine_function(run)
+    assert is_coroutine_function(Runner().run)
+    assert not is_coroutine_function(Runner().sync)
+    assert not is_coroutine_function(len)
+    assert not is_coroutine_function(LazyFunction("os.path:join"))
+
+
+def test_lazy_async_filter(tmp_path, monkeypatch):
+    '''an async filter given as "module:function" is run like run_async
+    '''
+    with open(str(tmp_path / "async_filter.py"), 'w') as filey:
+        filey.write("async def length(plugin, params, value):\n"
+                    "    return len(value)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    plugin = FilterPlugin(name="filter", usage="filter", logging=False)
+    values = ["a", "bb", "ccc"]
+    responses = run_plugin(plugin, "async_filter:length", get_filter_requests(values),
+                           monkeypatch)
+    assert len(responses) == 5
+    assert get_response_values(responses) == [{"Int": 1}, {"Int": 2}, {"Int": 3}]
+    assert responses[-1]['params'] == {'Ok': []}
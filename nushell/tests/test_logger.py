@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.logger import NushellLogger, CYAN, DEBUG
+
+import os
+import pytest
+
+
+def test_logger_writer(tmp_path):
+    '''messages written to a logfile are queued, and written on flush
+    '''
+    logfile = os.path.join(str(tmp_path), "nu_plugin_test.log")
+    logger = NushellLogger(logfile, level=DEBUG)
+
+    # The background writer is only started on first message
+    assert logger.writer is None
+    for i in range(1000):
+        logger.info("message %s" % i)
+    assert logger.writer is not None
+
+    logger.flush()
+    with open(logfile, 'r') as filey:
+        lines = filey.readlines()
+    assert len(lines) == 1000
+    assert lines[0] == "message 0\n"
+    assert lines[-1] == "message 999\n"
+
+    # Closing writes remaining messages and stops the writer
+    logger.warning("last message")
+    logger.close()
+    assert logger.writer is None
+    with open(logfile, 'r') as filey:
+        assert filey.readlines()[-1] == "WARNING last message\n"
+
+
+def test_logger_quiet(tmp_path):
+    '''a quiet logger never creates the logfile
+    '''
+    logfile = os.path.join(str(tmp_path), "nu_plugin_quiet.log")
+    logger = NushellLogger(logfile, level="QUIET")
+    logger.info("message")
+    logger.flush()
+    assert logger.writer is None
+    assert not os.path.exists(logfile)
+
+
+def test_logger_deferred(tmp_path):
+    '''arguments are only formatted (and callables called) if enabled
+    '''
+    calls = []
+    def expensive():
+        calls.append(1)
+        return "expensive"
+
+    logfile = os.path.join(str(tmp_path), "nu_plugin_deferred.log")
+    logger = NushellLogger(logfile, level="QUIET")
+    logger.info("value %s", expensive)
+    logger.debug(expensive)
+    assert not calls
+
+    logger = NushellLogger(logfile, level=DEBUG)
+    logger.info("value %s and %s", expensive, {"a": 1})
+    logger.debug(expensive)
+    logger.close()
+    assert len(calls) == 2
+    with open(logfile, 'r') as filey:
+        lines = filey.readlines()
+    assert lines == ["value expensive and {'a': 1}\n", "DEBUG expensive\n"]
+
+
+def test_logger_positional(tmp_path):
+    '''the return code of exit and color of custom are still positional,
+       and any args to format the message come after them
+    '''
+    logfile = os.path.join(str(tmp_path), "nu_plugin_positional.log")
+    logger = NushellLogger(logfile, level=DEBUG)
+    logger.custom("PREFIX", "message", CYAN)
+    logger.custom("PREFIX", "value %s", CYAN, 1)
+    with pytest.raises(SystemExit) as error:
+        logger.exit("exit %s", 3, "now")
+    assert error.value.code == 3
+    with pytest.raises(SystemExit) as error:
+        logger.exit("exit")
+    assert error.value.code == 1
+    logger.close()
+    with open(logfile, 'r') as filey:
+        lines = filey.readlines()
+    assert lines == ["PREFIX message\n", "PREFIX value 1\n", "ERROR exit now\n",
+                     "ERROR exit\n"]
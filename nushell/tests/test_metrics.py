@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.filter import FilterPlugin
+from nushell.metrics import Histogram, BUCKETS
+from nushell.sink import SinkPlugin
+from .helpers import get_filter_requests, run_plugin
+from .plugin_requests import config_request, sink_named_request
+
+import json
+
+
+def read_stats(path):
+    with open(path, 'r') as filey:
+        return [json.loads(line) for line in filey.read().splitlines()]
+
+
+def test_histogram():
+    '''latencies are counted in fixed buckets
+    '''
+    histogram = Histogram()
+    for seconds in [0.000005, 0.00001, 0.0002, 0.0002, 5]:
+        histogram.record(seconds)
+    summary = histogram.summary()
+    assert summary["count"] == 5
+    assert summary["max_us"] == 5e6
+    assert summary["buckets"] == {"<=10us": 2, "<=500us": 2,
+                                  ">%sus" % BUCKETS[-1]: 1}
+    assert len(histogram.counts) == len(BUCKETS) + 1
+
+
+def test_filter_metrics(tmp_path, monkeypatch):
+    '''a filter dumps metrics for each phase and method at end_filter
+    '''
+    path = str(tmp_path / "stats.jsonl")
+    monkeypatch.setenv("NU_PLUGIN_STATS", path)
+
+    def runFilter(plugin, params):
+        plugin.print_int_response(len(plugin.get_string_primitive()))
+
+    plugin = FilterPlugin(name="len", usage="length", logging=False)
+    requests = get_filter_requests(["a", "bb", "ccc"])
+    responses = run_plugin(plugin, runFilter, requests, monkeypatch)
+    assert len(responses) == 5
+
+    stats = read_stats(path)
+    assert len(stats) == 1
+    assert stats[0]["methods"]["filter"]["count"] == 3
+    assert stats[0]["methods"]["begin_filter"]["count"] == 1
+    assert set(["read", "decode", "dispatch", "encode", "write"]) <= set(stats[0]["phases"])
+    assert stats[0]["phases"]["read"]["count"] == 5
+    assert stats[0]["phases"]["encode"]["count"] == 5
+    assert stats[0]["bytes_read"] > 0
+
+    # All input was ready at once, so responses are written (once) before the dump
+    assert stats[0]["phases"]["write"]["count"] == 1
+    assert stats[0]["bytes_written"] == plugin.metrics.bytes_written > 0
+
+
+def test_filter_batch_metrics(tmp_path, monkeypatch):
+    '''batch mode dumps metrics when it's done, with the responses written
+    '''
+    path = str(tmp_path / "stats.jsonl")
+    monkeypatch.setenv("NU_PLUGIN_STATS", path)
+
+    def runBatch(plugin, params, values):
+        return [len(value) for value in values]
+
+    plugin = FilterPlugin(name="len", usage="length", logging=False)
+    requests = get_filter_requests(["a", "bb", "ccc"])
+    run_plugin(plugin, runBatch, requests, monkeypatch, method="run_batch")
+    stats = read_stats(path)
+    assert len(stats) == 1
+    assert stats[0]["phases"]["write"]["count"] >= 1
+    assert stats[0]["bytes_written"] == plugin.metrics.bytes_written > 0
+
+
+def test_sink_metrics(tmp_path, monkeypatch):
+    '''a sink dumps metrics when it's done, but config doesn't
+    '''
+    path = str(tmp_path / "stats.jsonl")
+    monkeypatch.setenv("NU_PLUGIN_STATS", path)
+
+    def sink(plugin, params):
+        print("hello")
+
+    plugin = SinkPlugin(name="hello", usage="hello", logging=False)
+    run_plugin(plugin, sink, [config_request], monkeypatch)
+    assert plugin.metrics.methods["config"].count == 1
+    assert not (tmp_path / "stats.jsonl").exists()
+
+    plugin = SinkPlugin(name="hello", usage="hello", logging=False)
+    run_plugin(plugin, sink, [sink_named_request], monkeypatch)
+    stats = read_stats(path)
+    assert stats[0]["methods"] == {"sink": stats[0]["phases"]["dispatch"]}
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.codec import get_encoding
+from nushell.filter import FilterPlugin
+from nushell.persistent import get_header
+from nushell.sink import SinkPlugin
+
+import io
+import json
+import os
+import select
+import subprocess
+import sys
+import pytest
+
+span = {"start": 0, "end": 3}
+root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+encodings = ["json", pytest.param("msgpack", marks=pytest.mark.skipif(
+    get_encoding("msgpack").encoding != "msgpack", reason="msgpack is not installed"))]
+
+
+def run_persistent(plugin, func, messages, monkeypatch, encoding="json"):
+    '''run a plugin started with --stdio, and return the messages it sends
+    '''
+    codec = get_encoding(encoding)
+    data = b"".join(codec.frame(message) for message in messages)
+    monkeypatch.setenv("NU_PLUGIN_ENCODING", encoding)
+    monkeypatch.setattr(sys, "argv", ["nu_plugin_test", "--stdio"])
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(data)))
+    plugin.writer.stream = io.BytesIO()
+    plugin.run(func)
+    output = plugin.writer.stream.getvalue()
+    header = get_header(encoding)
+    assert output.startswith(header)
+    output = output[len(header):]
+
+    if codec.binary:
+        unpacker = codec.unpacker()
+        unpacker.feed(output)
+        return list(unpacker)
+    return [json.loads(line) for line in output.splitlines()]
+
+
+def get_run_call(call_id, name, value, positional=None, named=None):
+    '''return a Run call for a value
+    '''
+    return {"Call": [call_id, {"Run": {
+        "name": name,
+        "call": {"head": span, "positional": positional or [], "named": named or []},
+        "input": {"Value": value}}}]}
+
+
+@pytest.mark.parametrize("encoding", encodings)
+def test_persistent_filter(monkeypatch, encoding):
+    '''a filter answers many calls from one process
+    '''
+    def runFilter(plugin, params):
+        value = plugin.get_string_primitive()
+        plugin.print_int_response(len(value) + params['_positional'][0])
+
+    plugin = FilterPlugin(name="len", usage="length", logging=False)
+    plugin.add_positional_argument("add", "Mandatory", "Int")
+    plugin.add_named_argument("loud", "Switch", usage="be loud")
+
+    add = [{"Int": {"val": 10, "span": span}}]
+    words = {"List": {"vals": [{"String": {"val": "a", "span": span}},
+                               {"String": {"val": "bbb", "span": span}}],
+                      "span": span}}
+    messages = [
+        {"Hello": {"protocol": "nu-plugin", "version": "0.92.0", "features": []}},
+        {"Call": [0, "Signature"]},
+        get_run_call(1, "len", {"String": {"val": "pancakes", "span": span}}, add),
+        get_run_call(2, "len", words, add),
+        get_run_call(3, "len", words, named=[[{"item": "help", "span": span}, None]]),
+        "Goodbye"]
+    responses = run_persistent(plugin, runFilter, messages, monkeypatch, encoding)
+
+    assert responses[0] == {"Hello": {"protocol": "nu-plugin", "version": "0.92.0",
+                                      "features": []}}
+    call_id, response = responses[1]["CallResponse"]
+    signature = response["Signature"][0]["sig"]
+    assert call_id == 0 and signature["name"] == "len"
+    assert signature["required_positional"][0]["name"] == "add"
+    assert [flag["long"] for flag in signature["named"]] == ["loud", "help"]
+
+    assert responses[2]["CallResponse"] == [1, {"PipelineData": {"Value": {
+        "Int": {"val": 18, "span": span}}}}]
+    value = responses[3]["CallResponse"][1]["PipelineData"]["Value"]
+    assert [v["Int"]["val"] for v in value["List"]["vals"]] == [11, 13]
+    value = responses[4]["CallResponse"][1]["PipelineData"]["Value"]
+    assert "length" in value["String"]["val"]
+
+
+def length(params, value):
+    '''a function for run_parallel must be defined at the top level
+    '''
+    return len(value)
+
+
+async def async_length(plugin, params, value):
+    return len(value)
+
+
+def batch_length(plugin, params, values):
+    return [len(value) for value in values]
+
+
+@pytest.mark.parametrize("method,func", [("run", async_length),
+                                         ("run_async", async_length),
+                                         ("run_batch", batch_length),
+                                         ("run_parallel", length)])
+def test_persistent_modes(monkeypatch, method, func):
+    '''async, batch and parallel filters answer calls like run
+    '''
+    plugin = FilterPlugin(name="len", usage="length", logging=False)
+    words = {"List": {"vals": [{"String": {"val": "a", "span": span}},
+                               {"String": {"val": "bbb", "span": span}}],
+                      "span": span}}
+    messages = [
+        {"Hello": {"protocol": "nu-plugin", "version": "0.92.0", "features": []}},
+        get_run_call(1, "len", {"String": {"val": "pancakes", "span": span}}),
+        get_run_call(2, "len", words),
+        "Goodbye"]
+    monkeypatch.setattr(plugin, "run", getattr(plugin, method))
+    responses = run_persistent(plugin, func, messages, monkeypatch)
+
+    assert responses[1]["CallResponse"] == [1, {"PipelineData": {"Value": {
+        "Int": {"val": 8, "span": span}}}}]
+    value = responses[2]["CallResponse"][1]["PipelineData"]["Value"]
+    assert [v["Int"]["val"] for v in value["List"]["vals"]] == [1, 3]
+
+
+def test_persistent_many_values(monkeypatch):
+    '''values a filter yields for each input are one list, rows are records
+    '''
+    def runFilter(plugin, params):
+        for word in plugin.get_string_primitive().split():
+            yield {"word": word, "half": len(word) / 2, "none": None}
+
+    plugin = FilterPlugin(name="words", usage="split words", logging=False)
+    messages = [
+        {"Hello": {"protocol": "nu-plugin", "version": "0.92.0", "features": []}},
+        get_run_call(1, "words", {"String": {"val": "a bb", "span": span}}),
+        "Goodbye"]
+    responses = run_persistent(plugin, runFilter, messages, monkeypatch)
+    value = responses[1]["CallResponse"][1]["PipelineData"]["Value"]
+    assert value == {"List": {"vals": [
+        {"Record": {"val": {"word": {"String": {"val": word, "span": span}},
+                            "half": {"Float": {"val": len(word) / 2, "span": span}},
+                            "none": {"Nothing": {"span": span}}}, "span": span}}
+        for word in ["a", "bb"]], "span": span}}
+
+
+@pytest.mark.parametrize("encoding", encodings)
+def test_persistent_sink(monkeypatch, encoding):
+    '''a sink returns what it prints as a string
+    '''
+    def sink(plugin, params):
+        print("Hello %s" % ", ".join(params['_pipe']))
+
+    plugin = SinkPlugin(name="hello", usage="hello", logging=False)
+    words = {"List": {"vals": [{"String": {"val": "a", "span": span}},
+                               {"String": {"val": "b", "span": span}}],
+                      "span": span}}
+    responses = run_persistent(plugin, sink, [get_run_call(7, "hello", words)],
+                               monkeypatch, encoding)
+    # We say Hello first, even when nushell doesn't
+    assert "Hello" in responses[0]
+    assert responses[1]["CallResponse"] == [7, {"PipelineData": {"Value": {
+        "String": {"val": "Hello a, b\n", "span": span}}}}]
+
+
+def test_persistent_hello_first():
+    '''the encoding and Hello are sent before nushell sends anything
+    '''
+    script = os.path.join(root, "examples", "len", "nu_plugin_len")
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop("NU_PLUGIN_ENCODING", None)
+    process = subprocess.Popen([sys.executable, script, "--stdio"], env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        header = get_header("json")
+        ready, _, _ = select.select([process.stdout], [], [], 30)
+        assert ready, "the plugin didn't send its encoding"
+        assert process.stdout.read(len(header)) == header
+        hello = json.loads(process.stdout.readline())
+        assert hello["Hello"]["protocol"] == "nu-plugin"
+    finally:
+        process.stdin.close()
+        process.stdout.close()
+        process.wait(timeout=30)
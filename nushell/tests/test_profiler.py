@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.filter import FilterPlugin
+from nushell.profiler import get_profiler
+from .helpers import get_filter_requests, run_plugin
+
+import os
+import pstats
+import tracemalloc
+import pytest
+
+
+def runFilter(plugin, params):
+    plugin.print_int_response(len(plugin.get_string_primitive()))
+
+
+def run_profiled(tmp_path, monkeypatch, mode, method="run"):
+    '''run a filter with NU_PLUGIN_PROFILE, and return the profile files
+    '''
+    monkeypatch.setenv("NU_PLUGIN_PROFILE", mode)
+    plugin = FilterPlugin(name="len", usage="length", logging=False)
+    plugin.logger.logfile = str(tmp_path / "nu_plugin_len.log")
+    func = runFilter
+    if method == "run_batch":
+        def func(plugin, params, values):
+            return [len(value) for value in values]
+
+    responses = run_plugin(plugin, func, get_filter_requests(["a", "bb"]),
+                           monkeypatch, method=method)
+    assert len(responses) == 4
+    return sorted(str(path) for path in tmp_path.iterdir()
+                  if path.name.startswith("nu_plugin_len.%s." % os.getpid()))
+
+
+@pytest.mark.parametrize("method", ["run", "run_batch"])
+def test_profile_cpu(tmp_path, monkeypatch, method):
+    '''a cpu profile is written next to the logfile
+    '''
+    files = run_profiled(tmp_path, monkeypatch, "cpu", method)
+    assert len(files) == 1 and files[0].endswith(".pstats")
+    functions = [name for (_, _, name) in pstats.Stats(files[0]).stats]
+    assert method in functions
+
+
+def test_profile_mem(tmp_path, monkeypatch):
+    '''a memory profile is a tracemalloc snapshot
+    '''
+    files = run_profiled(tmp_path, monkeypatch, "mem")
+    assert len(files) == 1 and files[0].endswith(".snapshot")
+    snapshot = tracemalloc.Snapshot.load(files[0])
+    assert snapshot.statistics("lineno")
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_sample(tmp_path, monkeypatch):
+    '''runs that aren't sampled (or without the variable) aren't profiled
+    '''
+    logfile = str(tmp_path / "nu_plugin_len.log")
+    assert get_profiler(logfile) is None
+    assert get_profiler(logfile, "cpu", sample=0) is None
+    assert get_profiler(logfile, "cpu", sample=1).prefix.startswith(str(tmp_path))
+    with pytest.raises(ValueError):
+        get_profiler(logfile, "disk")
+
+    monkeypatch.setenv("NU_PLUGIN_PROFILE_SAMPLE", "0")
+    assert run_profiled(tmp_path, monkeypatch, "cpu") == []
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.reader import RequestReader
+
+import io
+import pytest
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1024])
+def test_reader_lines(size):
+    '''lines are returned whole regardless of how reads split them
+    '''
+    data = b'{"a": 1}\n\n{"b": "two"}\n{"c": [1, 2, 3]}'
+    reader = RequestReader(io.BytesIO(data), size=size)
+    assert list(reader) == [b'{"a": 1}', b'{"b": "two"}', b'{"c": [1, 2, 3]}']
+
+
+def test_reader_ready():
+    '''a reader is ready if it has a complete line left from the last read
+    '''
+    reader = RequestReader(io.BytesIO(b"one\ntwo\nthree\n"))
+    lines = iter(reader)
+    assert next(lines) == b"one"
+    assert reader.ready()
+    assert next(lines) == b"two"
+    assert next(lines) == b"three"
+    assert not reader.ready()
+
+    # Empty lines are skipped, so they aren't ready to be returned
+    reader = RequestReader(io.BytesIO(b"req\n\n\n"))
+    lines = iter(reader)
+    assert next(lines) == b"req"
+    assert not reader.ready()
+    assert list(lines) == []
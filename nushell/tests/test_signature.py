@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.signature import read_signature, write_signature
+from .plugin_requests import config_request
+
+import json
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(os.path.dirname(here))
+
+script = '''from nushell.signature import answer_config
+answer_config()
+
+# A heavy import would go here, we leave a marker instead
+open(%r, 'a').write("imported\\n")
+
+from nushell.filter import FilterPlugin
+
+def runFilter(plugin, params):
+    plugin.print_int_response(len(plugin.get_string_primitive()))
+
+plugin = FilterPlugin(name="len", usage="length", logging=False)
+plugin.add_positional_argument("add", "Optional", "Int")
+plugin.run(runFilter)
+'''
+
+
+def run_script(path, signature, args=None):
+    '''run a plugin script with a config request, and return the output
+    '''
+    env = dict(os.environ, NU_PLUGIN_SIGNATURE=signature,
+               PYTHONPATH=os.pathsep.join([root, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, path] + (args or []),
+                            input=(json.dumps(config_request) + "\n").encode('utf-8'),
+                            stdout=subprocess.PIPE, env=env, check=True, timeout=60)
+    return result.stdout.decode('utf-8')
+
+
+def test_signature_config(tmp_path):
+    '''config is answered from the signature file until the script changes
+    '''
+    path = str(tmp_path / "nu_plugin_len")
+    marker = str(tmp_path / "marker")
+    signature = str(tmp_path / "nu_plugin_len.signature")
+    with open(path, 'w') as filey:
+        filey.write(script % marker)
+
+    # Without a signature file, we import everything
+    expected = json.loads(run_script(path, signature))
+    assert expected["params"]["Ok"]["name"] == "len"
+    assert open(marker).read() == "imported\n"
+
+    assert run_script(path, signature, ["--signature"]).strip() == signature
+    assert read_signature(path, signature) == expected["params"]["Ok"]
+    os.remove(marker)
+
+    # With it, we answer before the marker (the same response)
+    assert json.loads(run_script(path, signature)) == expected
+    assert not os.path.exists(marker)
+
+    # Only the mtime changed, the hash is the same
+    os.utime(path, (1, 1))
+    assert read_signature(path, signature) == expected["params"]["Ok"]
+
+    # The script changed, so we don't use the signature
+    with open(path, 'a') as filey:
+        filey.write("\n")
+    assert read_signature(path, signature) is None
+    assert json.loads(run_script(path, signature)) == expected
+    assert os.path.exists(marker)
+
+
+def test_signature_missing(tmp_path):
+    '''a missing or broken signature file is ignored
+    '''
+    path = str(tmp_path / "nu_plugin_len")
+    with open(path, 'w') as filey:
+        filey.write("")
+    signature = str(tmp_path / "signature")
+    assert read_signature(path, signature) is None
+    with open(signature, 'w') as filey:
+        filey.write("{")
+    assert read_signature(path, signature) is None
+    write_signature({"name": "len"}, path, signature)
+    assert read_signature(path, signature) == {"name": "len"}
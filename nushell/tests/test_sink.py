@@ -18,6 +18,8 @@ from .plugin_requests import (
     sink_help_request
 )
 
+import asyncio
+import copy
 import os
 import pytest
 
@@ -75,3 +77,57 @@ def test_sink_config(tmp_path):
     # Test without adding help
     plugin = SinkPlugin(name=plugin_name, usage=usage, logging=False, add_help=False)
     check_remove_help(plugin, plugin_name, usage, is_filter=False)
+
+
+def test_sink_async(tmp_path):
+    '''an async sink is run until complete, and can gather over values
+    '''
+    async def double(value):
+        await asyncio.sleep(0)
+        return value * 2
+
+    async def sink(plugin, params):
+        return await plugin.gather(double, [1, 2, 3], concurrency=2)
+
+    plugin = SinkPlugin(name="sink", usage="async sink", logging=False)
+    request = copy.deepcopy(sink_named_request)
+    assert plugin.test(sink, sink_named_request) == [2, 4, 6]
+
+    # The request isn't changed, so it can be sent again
+    assert sink_named_request == request
+    assert plugin.test(sink, sink_named_request) == [2, 4, 6]
+
+    # Values are taken from an iterator as workers are free, in order
+    taken = []
+    done = []
+    ahead = {"max": 0}
+    def pipe():
+        for value in range(100):
+            taken.append(value)
+            ahead["max"] = max(ahead["max"], len(taken) - len(done))
+            yield value
+
+    async def slow_double(value):
+        await asyncio.sleep(0.001 * (value % 3))
+        done.append(value)
+        return value * 2
+
+    results = plugin.run_coroutine(plugin.gather(slow_double, pipe(), concurrency=4))
+    assert results == [value * 2 for value in range(100)]
+    assert ahead["max"] <= 4
+
+
+def test_sink_primitives():
+    '''primitives can be parsed to a list, or iterated with a type filter
+    '''
+    plugin = SinkPlugin(name="sink", usage="sink", logging=False)
+    tag = {"anchor": None, "span": {"start": 0, "end": 2}}
+    listing = [{"tag": tag, "item": {"Primitive": {"Int": 1}}},
+               {"tag": tag, "item": {"Primitive": {"String": "two"}}},
+               {"tag": tag, "item": {"Primitive": {"Int": 3}}}]
+
+    assert plugin.parse_primitives(listing) == [1, "two", 3]
+    assert plugin.parse_primitives(None) == []
+    assert list(plugin.iter_primitives(listing, "Int")) == [1, 3]
+    assert list(plugin.iter_primitives(listing, ["String"])) == ["two"]
+    assert list(plugin.iter_primitives(iter(listing))) == [1, "two", 3]
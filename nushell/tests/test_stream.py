@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.sink import SinkPlugin
+from nushell.stream import StreamDecoder
+from .helpers import run_plugin
+from .plugin_requests import config_request
+
+import io
+import json
+import tracemalloc
+import pytest
+
+
+def get_sink_request(count):
+    '''return a sink request with a pipe of count String entries
+    '''
+    entry = {"tag": {"anchor": None, "span": {"start": 0, "end": 2}},
+             "item": {"Primitive": {"String": "value"}}}
+    args = {"args": {"positional": None, "named": None},
+            "name_tag": {"anchor": None, "span": {"start": 0, "end": 7}}}
+    pipe = []
+    for i in range(count):
+        entry["item"]["Primitive"]["String"] = "value-%s" % i
+        pipe.append(json.dumps(entry))
+    return ('{"jsonrpc": "2.0", "method": "sink", "params": [%s, [%s]]}\n'
+            % (json.dumps(args), ", ".join(pipe))).encode('utf-8')
+
+
+@pytest.mark.parametrize("size", [1, 5, 64, 65536])
+def test_stream_decoder(size):
+    '''a streamed request decodes to the same values as json
+    '''
+    data = get_sink_request(50)
+    expected = json.loads(data)
+    request = StreamDecoder(io.BytesIO(data), size=size).request()
+    assert request["method"] == "sink"
+    assert request["params"][0] == expected["params"][0]
+    assert list(request["params"][1]) == expected["params"][1]
+
+    data = json.dumps(config_request).encode('utf-8')
+    assert StreamDecoder(io.BytesIO(data), size=size).request() == config_request
+
+
+def test_stream_memory():
+    '''peak memory to iterate a streamed pipe doesn't grow with its size
+    '''
+    data = get_sink_request(100000)
+    stream = io.BytesIO(data)
+
+    tracemalloc.start()
+    request = StreamDecoder(stream).request()
+    count = sum(1 for entry in request["params"][1])
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count == 100000
+    assert peak < len(data) / 10
+
+
+def test_stream_sink(monkeypatch):
+    '''a sink with stream_pipe gets a lazy iterator of values
+    '''
+    values = []
+    def sink(plugin, params):
+        assert not isinstance(params['_pipe'], list)
+        values.extend(params['_pipe'])
+
+    plugin = SinkPlugin(name="sink", usage="sink", logging=False)
+    plugin.stream_pipe = True
+    lines = get_sink_request(1000).decode('utf-8')
+    run_plugin(plugin, sink, [json.loads(lines)], monkeypatch)
+    assert values == ["value-%s" % i for i in range(1000)]
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.filter import FilterPlugin
+from nushell.sink import SinkPlugin
+from nushell.trace import Tracer, get_tracer
+from .helpers import get_filter_requests, run_plugin
+from .plugin_requests import sink_named_request
+
+import json
+import os
+
+
+def read_trace(path):
+    with open(path, 'r') as filey:
+        return json.loads(filey.read())["traceEvents"]
+
+
+def test_filter_trace(tmp_path, monkeypatch):
+    '''a filter writes a span for reading and handling each request
+    '''
+    path = str(tmp_path / "trace.json")
+    monkeypatch.setenv("NU_PLUGIN_TRACE", path)
+
+    def runFilter(plugin, params):
+        plugin.print_int_response(len(plugin.get_string_primitive()))
+
+    plugin = FilterPlugin(name="len", usage="length", logging=False)
+    run_plugin(plugin, runFilter, get_filter_requests(["a", "bb"]), monkeypatch)
+
+    events = read_trace(path)
+    names = [event["name"] for event in events]
+    assert names.count("read") == 4
+    assert names.count("filter") == 2
+    assert names[-1] == "write"
+
+    filters = [event for event in events if event["name"] == "filter"]
+    assert [event["args"]["index"] for event in filters] == [1, 2]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    assert all(event["args"]["bytes"] > 0 for event in filters)
+
+
+def test_sink_trace(tmp_path, monkeypatch):
+    path = str(tmp_path / "trace.json")
+    monkeypatch.setenv("NU_PLUGIN_TRACE", path)
+
+    def sink(plugin, params):
+        print("hello")
+
+    plugin = SinkPlugin(name="hello", usage="hello", logging=False)
+    run_plugin(plugin, sink, [sink_named_request], monkeypatch)
+    assert [event["name"] for event in read_trace(path)] == ["read", "sink"]
+
+
+def test_tracer(tmp_path, monkeypatch):
+    '''the tracer is a ring buffer, and is only used if asked for
+    '''
+    logfile = str(tmp_path / "nu_plugin_len.log")
+    assert get_tracer(logfile) is None
+    monkeypatch.setenv("NU_PLUGIN_TRACE", "1")
+    assert get_tracer(logfile).path == str(tmp_path / ("nu_plugin_len.%s.trace.json"
+                                                       % os.getpid()))
+
+    tracer = Tracer(str(tmp_path / "ring.json"), size=3)
+    for index in range(5):
+        tracer.span("filter", index, index + 1, {"index": index})
+    events = read_trace(tracer.write())
+    assert [event["args"]["index"] for event in events] == [2, 3, 4]
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+# Copyright (C) 2019-2020 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nushell.writer import ResponseWriter
+from .plugin_requests import (
+    filter_begin_request,
+    filter_end_request,
+    filter_string_request
+)
+
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(os.path.dirname(here))
+
+
+def test_writer_policies():
+    '''each policy decides when buffered responses are written
+    '''
+    stream = io.BytesIO()
+    writer = ResponseWriter("always", stream=stream)
+    writer.write(b"one\n")
+    assert stream.getvalue() == b"one\n"
+
+    stream = io.BytesIO()
+    writer = ResponseWriter("size", size=8, stream=stream)
+    writer.write(b"one\n")
+    assert stream.getvalue() == b""
+    writer.write(b"two\n")
+    assert stream.getvalue() == b"one\ntwo\n"
+
+    stream = io.BytesIO()
+    writer = ResponseWriter("idle", size=8, stream=stream)
+    for _ in range(10):
+        writer.write(b"one\n")
+    assert stream.getvalue() == b""
+
+    # There is no input ready (or we can't tell), so we must write
+    writer.idle(io.BytesIO())
+    assert stream.getvalue() == b"one\n" * 10
+
+    with pytest.raises(ValueError):
+        ResponseWriter("sometimes")
+
+
+@pytest.mark.parametrize("policy", ["always", "idle", "size"])
+def test_writer_lockstep(policy):
+    '''a plugin must answer each request before nushell sends the next
+    '''
+    env = dict(os.environ, PYTHONPATH=root, NU_PLUGIN_FLUSH=policy)
+    plugin = os.path.join(root, "examples", "len", "nu_plugin_len")
+    proc = subprocess.Popen([sys.executable, plugin], env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    # If the plugin deadlocks, readline returns empty when it is killed
+    timer = threading.Timer(10, proc.kill)
+    timer.start()
+    try:
+        for request in [filter_begin_request, filter_string_request,
+                        filter_string_request, filter_end_request]:
+            proc.stdin.write(json.dumps(request).encode('utf-8') + b"\n")
+            proc.stdin.flush()
+            response = json.loads(proc.stdout.readline())
+            assert response["method"] == "response"
+        assert proc.wait(timeout=10) == 0
+    finally:
+        timer.cancel()
+        proc.kill()
@@ -0,0 +1,90 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import atexit
+import collections
+import json
+import os
+import time
+
+# Keep at most this many spans (the oldest are dropped)
+TRACE_SIZE = 100000
+
+
+class Tracer:
+
+    def __init__(self, path, size=TRACE_SIZE):
+        '''a Tracer keeps spans (a name, start and end) in a ring buffer,
+           and writes them as a Chrome trace (open it with chrome://tracing
+           or https://ui.perfetto.dev) when the plugin is done, or exits.
+
+           Parameters
+           ==========
+           path: the path to write the trace json
+           size: the maximum number of spans to keep
+        '''
+        self.path = path
+        self.spans = collections.deque(maxlen=size)
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+        atexit.register(self._write_at_exit)
+
+
+    def span(self, name, start, end, args=None):
+        '''record a span, with start and end from time.perf_counter, and
+           args (a dictionary) to show for it
+        '''
+        self.spans.append((name, start, end, args))
+
+
+    def get_events(self):
+        '''return the spans as complete ("X") trace events, in microseconds
+        '''
+        return [{"name": name,
+                 "ph": "X",
+                 "ts": round((start - self.start) * 1e6, 3),
+                 "dur": round((end - start) * 1e6, 3),
+                 "pid": self.pid,
+                 "tid": 1,
+                 "args": args or {}} for name, start, end, args in self.spans]
+
+
+    def write(self):
+        '''write the trace, replacing any we wrote before
+        '''
+        with open(self.path, 'w', encoding='utf-8') as filey:
+            filey.write(json.dumps({"traceEvents": self.get_events(),
+                                    "displayTimeUnit": "ms"}))
+        return self.path
+
+
+    def _write_at_exit(self):
+        try:
+            self.write()
+        except OSError:
+            pass
+
+
+def get_tracer(logfile, path=None, size=None):
+    '''return a Tracer if the environment variable NU_PLUGIN_TRACE is set,
+       or None. It can be a path for the trace, or 1 to write it next to
+       the logfile with the process id (nu_plugin_<name>.<pid>.trace.json)
+
+       Parameters
+       ==========
+       logfile: the plugin logfile, e.g., /tmp/nu_plugin_<name>.log
+       path: the trace path, defaults to NU_PLUGIN_TRACE
+       size: the number of spans to keep, defaults to NU_PLUGIN_TRACE_SIZE
+    '''
+    path = path or os.environ.get("NU_PLUGIN_TRACE")
+    if not path or path.lower() in ["0", "false"]:
+        return None
+
+    if path.lower() in ["1", "true"]:
+        path = "%s.%s.trace.json" % (os.path.splitext(logfile)[0], os.getpid())
+    size = size or int(os.environ.get("NU_PLUGIN_TRACE_SIZE", TRACE_SIZE))
+    return Tracer(path, size)
@@ -0,0 +1,123 @@
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import select
+import sys
+import time
+
+# Flush after every response, when waiting for input, or at a size (bytes)
+POLICIES = ["always", "idle", "size"]
+FLUSH_SIZE = 65536
+
+
+class ResponseWriter:
+
+    def __init__(self, policy=None, size=None, stream=None):
+        '''a ResponseWriter collects encoded responses (bytes) and writes
+           them to the binary stdout together. Nushell waits for a response
+           before sending the next request, so for every policy we write
+           out what we have before waiting for more input (see idle).
+
+           Parameters
+           ==========
+           policy: always: flush every response (no batching)
+                   idle: flush only when there is no more input ready
+                   size: also flush when size bytes are waiting
+                   defaults to NU_PLUGIN_FLUSH, or idle
+           size: the number of bytes for the size policy
+           stream: a binary stream to write to, defaults to sys.stdout.buffer
+        '''
+        policy = policy or os.environ.get("NU_PLUGIN_FLUSH") or "idle"
+        if policy not in POLICIES:
+            raise ValueError("%s is not a valid flush policy, choices are %s"
+                             % (policy, ", ".join(POLICIES)))
+        self.policy = policy
+        self.size = size or int(os.environ.get("NU_PLUGIN_FLUSH_SIZE", FLUSH_SIZE))
+        self.stream = stream
+        self.buffer = []
+        self.buffered = 0
+        self.metrics = None
+        self.tracer = None
+
+
+    def write(self, data):
+        '''add encoded bytes to the buffer, and flush according to the policy
+        '''
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.policy == "always":
+            self.flush()
+        elif self.policy == "size" and self.buffered >= self.size:
+            self.flush()
+
+
+    def idle(self, reader=None):
+        '''called before reading the next request. If there are responses
+           waiting and no more input is ready, we must flush them or nushell
+           would wait for us while we wait for it.
+
+           Parameters
+           ==========
+           reader: the RequestReader (or a stream) for input, defaults
+                   to sys.stdin
+        '''
+        if not self.buffer:
+            return
+
+        if hasattr(reader, "ready"):
+            ready = reader.ready()
+        else:
+            ready = input_ready(reader or sys.stdin)
+
+        if not ready:
+            self.flush()
+
+
+    def flush(self):
+        '''write all buffered responses to the stream in one call
+        '''
+        if not self.buffer:
+            return
+
+        stream = self.stream
+        if stream is None:
+
+            # Anything the user printed must come before our responses
+            sys.stdout.flush()
+            stream = getattr(sys.stdout, "buffer", None)
+
+        start = time.perf_counter()
+        data = b"".join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+
+        # If stdout doesn't have a buffer (e.g., replaced for testing)
+        if stream is None:
+            sys.stdout.write(data.decode('utf-8'))
+            sys.stdout.flush()
+        else:
+            stream.write(data)
+            stream.flush()
+
+        end = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.record("write", end - start, len(data))
+        if self.tracer is not None:
+            self.tracer.span("write", start, end, {"bytes": len(data)})
+
+
+def input_ready(stream, timeout=0):
+    '''return True if a stream has data that can be read without blocking,
+       False if it doesn't (or if we can't tell). If timeout is defined, we
+       wait up to that many seconds for data (None waits forever).
+    '''
+    try:
+        ready, _, _ = select.select([stream], [], [], timeout)
+    except (ValueError, OSError, TypeError, AttributeError):
+        return False
+    return bool(ready)